@@ -1,21 +1,31 @@
-
+import importlib
 
 import streamlit as st
-from ui.portfolio_ui import PortfolioUI
+from utils import profiling
+
+# Sidebar label -> (module, page function). A page's module, and the
+# pandas/DB stack behind it, is imported the first time a page is opened,
+# so the title and navigation render before any of it loads. Upload and
+# Diagnostics have their own modules and do not load the price provider or
+# the result cache.
+PAGES = {
+    "Upload Trades": ("ui.upload_ui", "upload_trades"),
+    "Upload Holdings": ("ui.upload_ui", "upload_holdings"),
+    "Portfolio": ("ui.portfolio_ui", "portfolio"),
+    "Transactions": ("ui.portfolio_ui", "transactions"),
+    "Cash Ledger": ("ui.portfolio_ui", "cash_ledger"),
+    "Export": ("ui.portfolio_ui", "export"),
+    "Watchlist": ("ui.portfolio_ui", "watchlist"),
+    "Diagnostics": ("ui.diagnostics_ui", "diagnostics"),
+}
+
+profiling.start_run()
 
 st.title("📊 Multi-Demat Portfolio Tracker")
-ui = PortfolioUI()
-menu = ui.sidebar()
+menu = st.sidebar.radio("Navigation", list(PAGES), key="page")
+profiling.label_run(menu)
 
-if menu == "Upload Holdings":
-    ui.upload_holdings()
-elif menu == "Upload Trades":
-    ui.upload_trades()
-elif menu == "Portfolio":
-    ui.portfolio()
-elif menu == "Cash Ledger":
-    ui.cash_ledger()
-elif menu == "Export":
-    ui.export()
-elif menu == "Watchlist":
-    ui.watchlist()
+module, page = PAGES[menu]
+with profiling.span(f"app.load[{module}]"):
+    ui = importlib.import_module(module).get_ui()
+getattr(ui, page)()
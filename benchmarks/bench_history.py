@@ -0,0 +1,72 @@
+"""NAV history benchmark: scan the snapshot store and compute TWR, XIRR and drawdowns.
+
+    python benchmarks/bench_history.py --years 5 10 --groups 40 --json bench_history.json
+"""
+import argparse
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from common import add_common_args, measure, report
+from utils import performance
+from utils.snapshots import SnapshotStore
+
+
+def build_store(root, years, n_groups, n_demats=5, seed=0):
+    """Daily group and cash rows for years of history, appended the way the snapshot job does."""
+    rng = np.random.default_rng(seed)
+    days = pd.date_range("2015-01-01", periods=int(years * 365), freq="D")
+    n_days = len(days)
+    demat = np.array([f"DEMAT{i % n_demats}" for i in range(n_groups)], dtype=object)
+    strategy = np.array([f"STRAT{i // n_demats}" for i in range(n_groups)], dtype=object)
+    invested = np.cumsum(rng.normal(50, 500, (n_days, n_groups)), axis=0) + 100_000
+    value = invested * np.cumprod(1 + rng.normal(0.0003, 0.01, (n_days, n_groups)), axis=0)
+    store = SnapshotStore(root)
+    store.groups.append(pd.DataFrame({
+        "date": np.repeat(days, n_groups),
+        "demat": np.tile(demat, n_days),
+        "strategy": np.tile(strategy, n_days),
+        "value": value.ravel(),
+        "open_cost": invested.ravel(),
+        "realized_pnl": 0.0,
+        "invested": invested.ravel(),
+    }))
+    flows = rng.normal(0, 1000, (n_days, n_demats))
+    store.cash.append(pd.DataFrame({
+        "date": np.repeat(days, n_demats),
+        "demat": np.tile([f"DEMAT{i}" for i in range(n_demats)], n_days),
+        "balance": (np.cumsum(flows, axis=0) + 1e7).ravel(),
+        "flow": flows.ravel(),
+    }))
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", nargs="+", type=float, default=[1, 5, 10])
+    parser.add_argument("--groups", type=int, default=40, help="(demat, strategy) pairs per day")
+    add_common_args(parser)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for years in args.years:
+        with tempfile.TemporaryDirectory() as root:
+            store = build_store(root, years, args.groups)
+            rows = len(store.groups)
+
+            def history():
+                return performance.summarize(store.nav_series())
+
+            def filtered():
+                return performance.summarize(store.nav_series(demats=["DEMAT0", "DEMAT1"], strategies=["STRAT0"]))
+
+            for name, fn in {f"history[{years:g}y]": history, f"history_filtered[{years:g}y]": filtered}.items():
+                seconds, peak = measure(fn, args.repeat)
+                results[name] = {"rows": rows, "seconds": seconds, "peak_mib": peak}
+    return report(results, args.json, args.baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+"""Runtime and peak memory of the holdings calculations on synthetic trades.
+
+    python benchmarks/bench_holdings.py --sizes 10k 100k 1M --json bench_holdings.json
+    python benchmarks/bench_holdings.py --sizes 10k 100k 1M --baseline bench_holdings.json
+"""
+import argparse
+import sys
+
+from common import SIZES, add_common_args, make_prices, make_trades, measure, report
+from utils.portfolio_utils import PortfolioUtils
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=list(SIZES), choices=list(SIZES))
+    add_common_args(parser)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for size in args.sizes:
+        trades = make_trades(SIZES[size])
+        prices = make_prices(trades["symbol"].unique())
+        cases = {
+            f"calculate_holdings[{size}]": lambda: PortfolioUtils.calculate_holdings(trades, prices),
+            f"calculate_fifo_holdings[{size}]": lambda: PortfolioUtils.calculate_fifo_holdings(trades, prices),
+        }
+        for name, fn in cases.items():
+            seconds, peak = measure(fn, args.repeat)
+            results[name] = {"rows": len(trades), "seconds": seconds, "peak_mib": peak}
+        del trades
+    return report(results, args.json, args.baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
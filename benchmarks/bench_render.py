@@ -0,0 +1,33 @@
+"""Render-time benchmark for the Portfolio tabs: one-pass summaries and HTML tables.
+
+    python benchmarks/bench_render.py --positions 5000 20000 --json bench_render.json
+"""
+import argparse
+import sys
+
+from common import add_common_args, make_holdings, measure, report
+from ui.html_table import render_table
+from utils.portfolio_utils import PortfolioUtils
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--positions", nargs="+", type=int, default=[5000, 20000, 100000])
+    add_common_args(parser)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for n in args.positions:
+        holdings = make_holdings(n)
+        cases = {
+            f"summarize_holdings[{n}]": lambda: PortfolioUtils.summarize_holdings(holdings),
+            f"render_table[{n}]": lambda: render_table(holdings, "pnl_pct", "green"),
+        }
+        for name, fn in cases.items():
+            seconds, peak = measure(fn, args.repeat)
+            results[name] = {"rows": n, "seconds": seconds, "peak_mib": peak}
+    return report(results, args.json, args.baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""Schema benchmark: text-keyed transactions (schema v8) vs dictionary-encoded trades (v9).
+
+    python benchmarks/bench_schema.py --sizes 1M --json bench_schema.json
+
+For each size, builds a v8 database, copies and migrates it, VACUUMs both,
+and reports file size, the time and memory to load every transaction, and
+calculate_holdings on the loaded frame.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+import pandas as pd
+
+from common import SIZES, add_common_args, make_prices, make_trades, measure, report
+from db.connection import ConnectionManager
+from db.portfolio_db import MIGRATIONS, TRANSACTION_COLUMNS, PortfolioDB, row_hashes
+from utils.portfolio_utils import PortfolioUtils
+
+LEGACY_VERSION = 8
+
+
+def build_legacy(path, trades):
+    manager = ConnectionManager.for_file(path)
+    manager.ensure_schema([m for m in MIGRATIONS if m[0] <= LEGACY_VERSION])
+    columns = ["date", "demat", "symbol", "qty", "price", "side", "strategy"]
+    rows = (values + (h,) for values, h in zip(trades[columns].itertuples(index=False, name=None), row_hashes(trades)))
+    with manager.transaction() as conn:
+        conn.executemany(f"INSERT INTO transactions ({', '.join(columns)}, row_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    manager.connect().execute("VACUUM")
+    manager.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", choices=SIZES, default=["100k", "1M"])
+    add_common_args(parser)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for size in args.sizes:
+        trades = make_trades(SIZES[size])
+        prices = make_prices(trades["symbol"].unique())
+        with tempfile.TemporaryDirectory() as root:
+            legacy_path, compact_path = os.path.join(root, "v8.db"), os.path.join(root, "v9.db")
+            build_legacy(legacy_path, trades)
+            shutil.copy(legacy_path, compact_path)
+            db = PortfolioDB(compact_path)
+            db.compact()
+            legacy = ConnectionManager.for_file(legacy_path).connect()
+
+            def load_legacy():
+                return pd.read_sql(f"SELECT {', '.join(TRANSACTION_COLUMNS)} FROM transactions", legacy)
+
+            frames = {"v8": load_legacy(), "v9": db.query_transactions()}
+            for name, load in {"v8": load_legacy, "v9": db.query_transactions}.items():
+                seconds, peak = measure(load, args.repeat)
+                results[f"load[{name},{size}]"] = {"rows": len(trades), "seconds": seconds, "peak_mib": peak}
+                seconds, peak = measure(lambda: PortfolioUtils.calculate_holdings(frames[name], prices), args.repeat)
+                results[f"calculate_holdings[{name},{size}]"] = {"rows": len(trades), "seconds": seconds, "peak_mib": peak}
+            for name, path in {"v8": legacy_path, "v9": compact_path}.items():
+                print(f"{name} {size}: file {os.path.getsize(path) / 2**20:,.1f} MiB, "
+                      f"frame {frames[name].memory_usage(deep=True).sum() / 2**20:,.1f} MiB")
+            for path in (legacy_path, compact_path):
+                ConnectionManager.for_file(path).close()
+    return report(results, args.json, args.baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
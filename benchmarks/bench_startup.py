@@ -0,0 +1,82 @@
+"""Startup benchmark: cold start and warm rerun latency of each app page.
+
+    python benchmarks/bench_startup.py --pages Portfolio Export --trades 100k --json bench_startup.json
+
+Each page is measured in a fresh interpreter (Streamlit's AppTest harness),
+against a seeded database in a temporary directory:
+  cold  first script run, including every import the page triggers
+  warm  best of --repeat reruns in the same process (one app session)
+peak_mib is the child process's peak RSS.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import SIZES, add_common_args, make_trades, report
+
+REPO = Path(__file__).resolve().parents[1]
+PAGES = ["Upload Trades", "Portfolio", "Transactions", "Cash Ledger", "Export", "Watchlist", "Diagnostics"]
+
+
+def seed(db_file, n_trades):
+    from db.portfolio_db import PortfolioDB
+    db = PortfolioDB(db_file)
+    trades = make_trades(n_trades)
+    db.insert_transactions_bulk(trades)
+    db.sync_lots()
+    for demat in trades["demat"].unique():
+        db.insert_cash("2015-01-01", demat, 1_000_000.0, "opening balance")
+
+
+def run_page(page, repeat):
+    """Child process: time the first run and the reruns of one page; print JSON."""
+    import resource
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(str(REPO / "app.py"), default_timeout=600)
+    at.session_state["page"] = page
+    start = time.perf_counter()
+    at.run()
+    cold = time.perf_counter() - start
+    warm = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        at.run()
+        warm = min(warm, time.perf_counter() - start)
+    errors = [str(e.value) for e in at.exception]
+    print(json.dumps({"cold": cold, "warm": warm, "modules": len(sys.modules), "errors": errors,
+                      "peak_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", nargs="+", choices=PAGES, default=PAGES)
+    parser.add_argument("--trades", choices=SIZES, default="100k")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    add_common_args(parser)
+    args = parser.parse_args(argv)
+    if args.child:
+        run_page(args.child, args.repeat)
+        return 0
+
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        seed(os.path.join(root, "portfolio.db"), SIZES[args.trades])
+        for page in args.pages:
+            out = subprocess.run([sys.executable, __file__, "--child", page, "--repeat", str(args.repeat)],
+                                 cwd=root, capture_output=True, text=True, check=True)
+            child = json.loads(out.stdout.strip().splitlines()[-1])
+            if child["errors"]:
+                print(f"{page}: {child['errors']}", file=sys.stderr)
+            print(f"{page:<16} {child['modules']:>6} modules loaded")
+            for phase in ("cold", "warm"):
+                results[f"{phase}[{page}]"] = {"rows": SIZES[args.trades], "seconds": child[phase], "peak_mib": child["peak_mib"]}
+    return report(results, args.json, args.baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
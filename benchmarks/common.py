@@ -0,0 +1,99 @@
+"""Shared helpers for the benchmark scripts: synthetic data and measurement."""
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Benchmarks run as plain scripts from the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000, "10M": 10_000_000}
+
+
+def make_trades(n, n_symbols=2000, n_demats=5, n_strategies=4, seed=0):
+    rng = np.random.default_rng(seed)
+    symbols = np.array([f"SYM{i:05d}" for i in range(n_symbols)], dtype=object)
+    demats = np.array([f"DEMAT{i}" for i in range(n_demats)], dtype=object)
+    strategies = np.array([f"STRAT{i}" for i in range(n_strategies)], dtype=object)
+    days = pd.date_range("2015-01-01", periods=3650, freq="D").strftime("%Y-%m-%d").to_numpy(dtype=object)
+    return pd.DataFrame({
+        "date": np.sort(days[rng.integers(0, len(days), n)]),
+        "demat": demats[rng.integers(0, n_demats, n)],
+        "symbol": symbols[rng.integers(0, n_symbols, n)],
+        "qty": rng.integers(1, 500, n),
+        "price": rng.uniform(10, 5000, n).round(2),
+        "side": np.where(rng.random(n) < 0.65, "BUY", "SELL").astype(object),
+        "strategy": strategies[rng.integers(0, n_strategies, n)],
+    })
+
+
+def make_prices(symbols, seed=0):
+    rng = np.random.default_rng(seed)
+    return dict(zip(symbols, rng.uniform(10, 5000, len(symbols)).round(2)))
+
+
+def measure(fn, repeat=3):
+    """Best-of-N wall time in seconds and peak traced memory in MiB."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / 2**20
+
+
+def report(results, json_path=None, baseline_path=None, tolerance=0.25):
+    """Print results and return a non-zero exit code if any case regressed past tolerance."""
+    for name, r in results.items():
+        print(f"{name:<32} {r['seconds'] * 1000:>10.1f} ms {r['peak_mib']:>10.1f} MiB")
+    if json_path:
+        Path(json_path).write_text(json.dumps(results, indent=2))
+    if not baseline_path:
+        return 0
+    baseline = json.loads(Path(baseline_path).read_text())
+    failed = 0
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric in ("seconds", "peak_mib"):
+            if r[metric] > base[metric] * (1 + tolerance):
+                print(f"REGRESSION {name} {metric}: {base[metric]:.3f} -> {r[metric]:.3f}")
+                failed = 1
+    return failed
+
+
+def add_common_args(parser):
+    parser.add_argument("--json", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a previous --json file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown/growth vs baseline")
+    parser.add_argument("--repeat", type=int, default=3)
+
+
+def make_holdings(n_positions, n_demats=5, n_strategies=4, seed=0):
+    """Synthetic output of calculate_holdings with n_positions open positions."""
+    rng = np.random.default_rng(seed)
+    net_qty = rng.integers(1, 1000, n_positions).astype("float64")
+    avg_price = rng.uniform(10, 5000, n_positions)
+    cmp = (avg_price * rng.uniform(0.5, 1.6, n_positions)).round(2)
+    df = pd.DataFrame({
+        "demat": np.array([f"DEMAT{i}" for i in range(n_demats)], dtype=object)[rng.integers(0, n_demats, n_positions)],
+        "strategy": np.array([f"STRAT{i}" for i in range(n_strategies)], dtype=object)[rng.integers(0, n_strategies, n_positions)],
+        "symbol": np.array([f"SYM{i:05d}" for i in range(n_positions)], dtype=object),
+        "net_qty": net_qty,
+        "avg_price": avg_price,
+        "cmp": cmp,
+    })
+    df["investment"] = df["net_qty"] * df["avg_price"]
+    df["current_value"] = df["net_qty"] * df["cmp"]
+    df["pnl"] = df["current_value"] - df["investment"]
+    df["pnl_pct"] = (df["pnl"] / df["investment"] * 100).round(2)
+    return df
@@ -0,0 +1,181 @@
+"""Headless entry point for batch jobs.
+
+    python cli.py ingest DIR --kind trades [--demat NAME] [--strategy NAME] [--workers N]
+    python cli.py rebuild-positions
+    python cli.py snapshot [--date YYYY-MM-DD]
+    python cli.py compact
+
+Files are parsed and normalized in a process pool with the same column
+aliases as the upload pages; all inserts go through one writer connection
+in the main process, so SQLite never sees competing writers.
+"""
+import argparse
+import datetime
+import functools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from db.portfolio_db import DB_FILE, PortfolioDB
+from utils import importer
+from utils.portfolio_utils import PortfolioUtils, HOLDINGS_CSV_FIELDS, HOLDINGS_XLSX_FIELDS
+from utils.price_provider import default_provider
+from utils.snapshots import SnapshotStore
+
+EXTENSIONS = (".csv", ".xlsx")
+DEFAULT_STRATEGY = {"trades": "Swing", "holdings": "Long Term"}
+MAX_PRINTED_ERRORS = 10
+
+
+def find_files(root, recursive=True):
+    if os.path.isfile(root):
+        return [root]
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        found.extend(os.path.join(dirpath, f) for f in sorted(filenames)
+                     if f.lower().endswith(EXTENSIONS) and not f.startswith("~$"))
+        if not recursive:
+            break
+    return found
+
+
+def normalizer(path, kind, demat, strategy, date):
+    # A partial of a module-level function so it can be sent to worker processes
+    if kind == "holdings":
+        fields = HOLDINGS_CSV_FIELDS if path.lower().endswith(".csv") else HOLDINGS_XLSX_FIELDS
+        return functools.partial(PortfolioUtils.normalize_holdings, fields=fields,
+                                 demat=demat, strategy=strategy, date=date)
+    return functools.partial(PortfolioUtils.normalize_trades, demat=demat, strategy=strategy)
+
+
+def _parse(path, normalize, chunksize):
+    start = time.perf_counter()
+    parsed = importer.parse_file(path, normalize, chunksize)
+    return parsed, time.perf_counter() - start
+
+
+def ingest(args):
+    files = find_files(args.path, recursive=not args.no_recursive)
+    if not files:
+        print(f"No CSV/XLSX files under {args.path}", file=sys.stderr)
+        return 1
+    db = PortfolioDB(args.db)
+    date = datetime.date.today().isoformat()
+    strategy = args.strategy or DEFAULT_STRATEGY[args.kind]
+
+    print(f"{'file':<48} {'demat':<14} {'rows':>9} {'new':>9} {'dup':>9} {'errors':>7} {'parse_s':>8} {'insert_s':>8} {'rows/s':>9}")
+    totals = {"rows": 0, "new": 0, "dup": 0, "errors": 0}
+    failed = 0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {}
+        for path in files:
+            # Default demat is the folder the file sits in, e.g. exports/Zerodha/2024-01.csv
+            demat = args.demat or os.path.basename(os.path.dirname(os.path.abspath(path)))
+            normalize = normalizer(path, args.kind, demat, strategy, date)
+            futures[pool.submit(_parse, path, normalize, args.chunksize)] = (path, demat)
+        # Insert in completion order; the pool keeps parsing while we write
+        for future in as_completed(futures):
+            # pop so each parsed file is freed once it is inserted
+            path, demat = futures.pop(future)
+            name = os.path.relpath(path, args.path) if os.path.isdir(args.path) else os.path.basename(path)
+            try:
+                parsed, parse_s = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"{name:<48} {demat:<14} failed to read: {e}")
+                continue
+            insert_start = time.perf_counter()
+            inserted = duplicates = 0
+            for tx in parsed.chunks:
+                result = db.insert_transactions_bulk(tx)
+                inserted += result.inserted
+                duplicates += result.duplicates
+            insert_s = time.perf_counter() - insert_start
+            rate = parsed.rows_read / (parse_s + insert_s) if parse_s + insert_s else 0
+            print(f"{name:<48} {demat:<14} {parsed.rows_read:>9,} {inserted:>9,} {duplicates:>9,} "
+                  f"{parsed.error_count:>7,} {parse_s:>8.2f} {insert_s:>8.2f} {rate:>9,.0f}")
+            for err in parsed.errors[:MAX_PRINTED_ERRORS]:
+                print(f"    {err}")
+            if parsed.error_count > MAX_PRINTED_ERRORS:
+                print(f"    ... and {parsed.error_count - MAX_PRINTED_ERRORS} more.")
+            totals["rows"] += parsed.rows_read
+            totals["new"] += inserted
+            totals["dup"] += duplicates
+            totals["errors"] += parsed.error_count
+
+    db.sync_lots()
+    elapsed = time.perf_counter() - started
+    print(f"{len(files) - failed} files, {totals['rows']:,} rows read, {totals['new']:,} new, "
+          f"{totals['dup']:,} duplicates, {totals['errors']:,} row errors in {elapsed:.2f}s "
+          f"({totals['rows'] / elapsed if elapsed else 0:,.0f} rows/s)")
+    return 1 if failed else 0
+
+
+def rebuild_positions(args):
+    db = PortfolioDB(args.db)
+    diff = db.rebuild_positions()
+    if diff.empty:
+        print("Positions already match transactions.")
+    else:
+        print(f"Corrected {len(diff)} positions:")
+        print(diff.to_string(index=False))
+    return 0
+
+
+def snapshot(args):
+    db = PortfolioDB(args.db)
+    store = SnapshotStore.for_db(args.db)
+    try:
+        taken = store.take(db, default_provider(db), args.date)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if taken is None:
+        print(f"Snapshot for {args.date or datetime.date.today()} already taken.")
+    else:
+        print(f"Snapshot {taken.date}: {taken.positions} positions, {taken.groups} demat/strategy groups, "
+              f"{taken.cash} cash balances -> {store.root}")
+    return 0
+
+
+def compact(args):
+    db = PortfolioDB(args.db)
+    before, after = db.compact()
+    print(f"{args.db}: {before / 2**20:,.1f} MiB -> {after / 2**20:,.1f} MiB")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Portfolio tracker batch jobs")
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database file (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("ingest", help="Load every CSV/XLSX file under a directory")
+    p.add_argument("path", help="Directory (or single file) to ingest")
+    p.add_argument("--kind", choices=["trades", "holdings"], default="trades")
+    p.add_argument("--demat", help="Demat for every file (default: each file's parent directory name)")
+    p.add_argument("--strategy", help="Strategy for every file (default: Swing for trades, Long Term for holdings)")
+    p.add_argument("--workers", type=int, default=os.cpu_count(), help="Parser processes (default: CPU count)")
+    p.add_argument("--chunksize", type=int, default=importer.CHUNK_ROWS)
+    p.add_argument("--no-recursive", action="store_true", help="Only read files directly in the directory")
+    p.set_defaults(func=ingest)
+
+    p = commands.add_parser("rebuild-positions", help="Recompute positions and lots from transactions")
+    p.set_defaults(func=rebuild_positions)
+
+    p = commands.add_parser("snapshot", help="Append today's valuation to the NAV history store (run daily)")
+    p.add_argument("--date", help="Snapshot date (default: today); must be after the latest snapshot")
+    p.set_defaults(func=snapshot)
+
+    p = commands.add_parser("compact", help="VACUUM the database to reclaim free pages (needs exclusive access)")
+    p.set_defaults(func=compact)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
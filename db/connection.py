@@ -0,0 +1,149 @@
+import os
+import queue
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+
+# Applied to every new connection. WAL lets readers run alongside the single
+# writer, and NORMAL sync is safe under WAL (only the last commit can be lost
+# on power failure, never corruption).
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negative = KiB, so 64 MiB
+    "foreign_keys": "ON",
+}
+BUSY_TIMEOUT_MS = 5000
+# Idle connections kept for reuse; any beyond this are closed when released
+MAX_IDLE_CONNECTIONS = 8
+
+
+class _Lease:
+    # A thread's hold on a pooled connection. It lives in thread-local
+    # storage, so it is collected when the thread exits and a finalizer
+    # hands the connection back to the pool.
+    def __init__(self, conn, pid):
+        self.conn = conn
+        self.pid = pid
+
+
+class ConnectionManager:
+    """Process-wide SQLite access for one database file, schema set up once.
+
+    Each thread holds one tuned connection while it runs. Connections come
+    from a process-wide pool and go back to it when the thread exits, so
+    short-lived threads (Streamlit runs every rerun on a new one) reuse
+    connections instead of opening a new one each time.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def for_file(cls, db_file):
+        key = os.path.abspath(db_file)
+        with cls._instances_lock:
+            manager = cls._instances.get(key)
+            if manager is None:
+                manager = cls._instances[key] = cls(db_file)
+            return manager
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_version = None
+        self._pool = queue.Queue()
+        self._pool_pid = os.getpid()
+
+    def _open(self):
+        # check_same_thread is off because a pooled connection moves between
+        # threads; a lease guarantees only one thread uses it at a time.
+        conn = sqlite3.connect(self.db_file, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        for name, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def connect(self):
+        lease = getattr(self._local, "lease", None)
+        # Connections must not cross a fork (e.g. multiprocessing workers)
+        if lease is None or lease.pid != os.getpid():
+            pid = os.getpid()
+            if self._pool_pid != pid:
+                self._pool, self._pool_pid = queue.Queue(), pid
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                conn = self._open()
+            lease = self._local.lease = _Lease(conn, pid)
+            weakref.finalize(lease, self._release, self._pool, conn, pid)
+        return lease.conn
+
+    @staticmethod
+    def _release(pool, conn, pid):
+        if pid != os.getpid():
+            return
+        try:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            if pool.qsize() < MAX_IDLE_CONNECTIONS:
+                pool.put(conn)
+                return
+        except sqlite3.Error:
+            pass
+        conn.close()
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent writers
+        # queue on busy_timeout instead of failing halfway through.
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def ensure_schema(self, migrations):
+        """Apply pending (version, statements) migrations once per process, tracked in PRAGMA user_version."""
+        target = migrations[-1][0] if migrations else 0
+        if self._schema_version == target:
+            return
+        with self._schema_lock:
+            if self._schema_version == target:
+                return
+            conn = self.connect()
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            if current < target:
+                with self.transaction() as conn:
+                    # Re-read under the write lock in case another process migrated first
+                    current = conn.execute("PRAGMA user_version").fetchone()[0]
+                    for version, statements in migrations:
+                        if version <= current:
+                            continue
+                        for statement in statements:
+                            if callable(statement):
+                                statement(conn)
+                            else:
+                                conn.execute(statement)
+                        conn.execute(f"PRAGMA user_version = {version}")
+            self._schema_version = target
+
+    def close(self):
+        """Close this thread's connection and every idle pooled one."""
+        lease = getattr(self._local, "lease", None)
+        if lease is not None:
+            self._local.lease = None
+            lease.conn.close()
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
@@ -1,89 +1,639 @@
-import sqlite3
+import hashlib
+from collections import namedtuple
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
+from db.connection import ConnectionManager
+from utils.lots import KEYS as LOT_KEYS, LotEngine
+from utils.profiling import timed_methods
 
 DB_FILE = "portfolio.db"
 
+# Positions hold running totals per (demat, strategy, symbol); avg_price is
+# total_cost / total_qty, matching PortfolioUtils.calculate_holdings.
+POSITION_TOTALS = '''SUM(CASE WHEN UPPER(side) = 'BUY' THEN qty ELSE -qty END) AS net_qty,
+                     SUM(qty) AS total_qty,
+                     SUM(qty * price) AS total_cost'''
+POSITION_KEYS_NOT_NULL = "demat IS NOT NULL AND strategy IS NOT NULL AND symbol IS NOT NULL"
+UPSERT_POSITIONS = f'''INSERT INTO positions (demat, strategy, symbol, net_qty, total_qty, total_cost)
+                      SELECT demat, strategy, symbol, {POSITION_TOTALS}
+                      FROM {{source}}
+                      WHERE {POSITION_KEYS_NOT_NULL}
+                      GROUP BY demat, strategy, symbol
+                      ON CONFLICT (demat, strategy, symbol) DO UPDATE SET
+                          net_qty = net_qty + excluded.net_qty,
+                          total_qty = total_qty + excluded.total_qty,
+                          total_cost = total_cost + excluded.total_cost'''
+
+# Name-level view over trades. LEFT JOINs keep rows with a NULL key, and
+# let SQLite drop the joins a query does not use.
+TRANSACTIONS_VIEW = '''CREATE VIEW IF NOT EXISTS transactions AS
+    SELECT t.id, t.date, d.name AS demat, sy.name AS symbol, t.qty, t.price, t.side, st.name AS strategy,
+           t.row_hash, t.demat_id, t.strategy_id, t.symbol_id
+    FROM trades t
+    LEFT JOIN demats d ON d.id = t.demat_id
+    LEFT JOIN strategies st ON st.id = t.strategy_id
+    LEFT JOIN symbols sy ON sy.id = t.symbol_id'''
+# Key column -> dictionary table
+DICTIONARIES = {"demat": "demats", "strategy": "strategies", "symbol": "symbols"}
+
+# (schema version, statements). Append new versions; never edit applied ones.
+MIGRATIONS = [
+    (1, [
+        '''CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT,
+                demat TEXT,
+                symbol TEXT,
+                qty INTEGER,
+                price REAL,
+                side TEXT,
+                strategy TEXT
+            )''',
+        '''CREATE TABLE IF NOT EXISTS cash_ledger (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT,
+                demat TEXT,
+                amount REAL,
+                note TEXT
+            )''',
+        '''CREATE TABLE IF NOT EXISTS watchlist (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                symbol TEXT,
+                tag TEXT,
+                note TEXT
+            )''',
+    ]),
+    (2, [
+        "CREATE INDEX IF NOT EXISTS idx_transactions_demat_strategy_symbol_date ON transactions (demat, strategy, symbol, date)",
+        "CREATE INDEX IF NOT EXISTS idx_cash_ledger_demat_date ON cash_ledger (demat, date)",
+    ]),
+    (3, [
+        '''CREATE TABLE IF NOT EXISTS positions (
+                demat TEXT NOT NULL,
+                strategy TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                net_qty INTEGER NOT NULL DEFAULT 0,
+                total_qty INTEGER NOT NULL DEFAULT 0,
+                total_cost REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (demat, strategy, symbol)
+            ) WITHOUT ROWID''',
+        "DELETE FROM positions",
+        UPSERT_POSITIONS.format(source="transactions"),
+    ]),
+    (4, [
+        '''CREATE TABLE IF NOT EXISTS prices (
+                symbol TEXT PRIMARY KEY,
+                price REAL NOT NULL,
+                updated_at REAL NOT NULL
+            ) WITHOUT ROWID''',
+    ]),
+    (5, [
+        '''CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            ) WITHOUT ROWID''',
+        "INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0)",
+    ]),
+    (6, [
+        # FIFO lot state maintained by sync_lots; lots_watermark is the last
+        # transaction id it has processed.
+        '''CREATE TABLE IF NOT EXISTS lots (
+                demat TEXT NOT NULL,
+                strategy TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                date TEXT,
+                qty INTEGER NOT NULL,
+                price REAL NOT NULL,
+                PRIMARY KEY (demat, strategy, symbol, seq)
+            ) WITHOUT ROWID''',
+        "ALTER TABLE positions ADD COLUMN open_cost REAL NOT NULL DEFAULT 0",
+        "ALTER TABLE positions ADD COLUMN realized_pnl REAL NOT NULL DEFAULT 0",
+        "ALTER TABLE positions ADD COLUMN last_date TEXT",
+        "INSERT OR IGNORE INTO meta (key, value) VALUES ('lots_watermark', 0)",
+    ]),
+    (7, [
+        # Natural key for uploaded rows; rows inserted before this (and manual
+        # single inserts) have NULL, which UNIQUE does not constrain.
+        "ALTER TABLE transactions ADD COLUMN row_hash BLOB",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_row_hash ON transactions (row_hash)",
+    ]),
+    (8, [
+        # Keyset pagination orders by (column, id); id is the rowid, which
+        # every index already carries as its last key.
+        "CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_demat_date ON transactions (demat, date)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_symbol ON transactions (symbol)",
+        "CREATE INDEX IF NOT EXISTS idx_cash_ledger_date ON cash_ledger (date)",
+        # Covering index for opening balances: a demat's amounts before a key
+        # are summed from the index alone
+        "DROP INDEX IF EXISTS idx_cash_ledger_demat_date",
+        "CREATE INDEX IF NOT EXISTS idx_cash_ledger_demat_date_amount ON cash_ledger (demat, date, amount)",
+        # Per-demat ledger totals, kept current by insert_cash, so pages near
+        # the newest rows can work back from the total instead of summing
+        # the whole history
+        '''CREATE TABLE IF NOT EXISTS cash_balances (
+            demat TEXT PRIMARY KEY,
+            balance REAL NOT NULL
+        )''',
+        "INSERT OR REPLACE INTO cash_balances (demat, balance) SELECT demat, SUM(amount) FROM cash_ledger GROUP BY demat",
+    ]),
+    (9, [
+        # Dictionary-encode demat/strategy/symbol: the rows move to trades with
+        # integer ids and transactions becomes a view with the old columns, so
+        # name-based reads and filters keep working unchanged.
+        *[f'''CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )''' for table in ("demats", "strategies", "symbols")],
+        *[f"INSERT OR IGNORE INTO {table} (name) SELECT DISTINCT {col} FROM transactions WHERE {col} IS NOT NULL ORDER BY {col}"
+          for col, table in (("demat", "demats"), ("strategy", "strategies"), ("symbol", "symbols"))],
+        '''CREATE TABLE IF NOT EXISTS trades (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT,
+                demat_id INTEGER REFERENCES demats (id),
+                strategy_id INTEGER REFERENCES strategies (id),
+                symbol_id INTEGER REFERENCES symbols (id),
+                qty INTEGER,
+                price REAL,
+                side TEXT,
+                row_hash BLOB
+            )''',
+        '''INSERT INTO trades (id, date, demat_id, strategy_id, symbol_id, qty, price, side, row_hash)
+           SELECT t.id, t.date, d.id, st.id, sy.id, t.qty, t.price, t.side, t.row_hash
+           FROM transactions t
+           LEFT JOIN demats d ON d.name = t.demat
+           LEFT JOIN strategies st ON st.name = t.strategy
+           LEFT JOIN symbols sy ON sy.name = t.symbol
+           ORDER BY t.id''',
+        "DROP TABLE transactions",
+        TRANSACTIONS_VIEW,
+        "CREATE INDEX IF NOT EXISTS idx_trades_keys_date ON trades (demat_id, strategy_id, symbol_id, date)",
+        "CREATE INDEX IF NOT EXISTS idx_trades_date ON trades (date)",
+        "CREATE INDEX IF NOT EXISTS idx_trades_demat_date ON trades (demat_id, date)",
+        "CREATE INDEX IF NOT EXISTS idx_trades_symbol ON trades (symbol_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_trades_row_hash ON trades (row_hash)",
+    ]),
+]
+
+InsertResult = namedtuple("InsertResult", ["inserted", "duplicates"])
+
+TRANSACTION_COLUMNS = ["id", "date", "demat", "symbol", "qty", "price", "side", "strategy"]
+CASH_COLUMNS = ["id", "date", "demat", "amount", "note"]
+WATCHLIST_COLUMNS = ["id", "symbol", "tag", "note"]
+# Stay well under SQLITE_MAX_VARIABLE_NUMBER on older builds
+MAX_PARAMS = 500
+# Browsable tables: (columns, filterable columns, sortable columns); sort
+# columns must be NOT NULL in practice since NULLs drop out of keyset comparisons
+PAGE_TABLES = {
+    "transactions": (TRANSACTION_COLUMNS, ("demat", "strategy", "symbol", "side"), ("date", "id", "symbol")),
+    "cash_ledger": (CASH_COLUMNS + ["balance"], ("demat",), ("date",)),
+    "watchlist": (WATCHLIST_COLUMNS, ("symbol", "tag"), ("id", "symbol", "tag")),
+}
+# transactions in symbol-name order: CROSS JOIN makes SQLite walk symbols by
+# their unique name index and each symbol's trades by idx_trades_symbol
+# (symbol_id, id), so a page ordered by (symbol, id) needs no sort. Through
+# the view, trades come first and every page sorts the whole table.
+# Trades without a symbol are not listed in this order.
+TRANSACTIONS_BY_SYMBOL = '''(SELECT t.id, t.date, d.name AS demat, sy.name AS symbol, t.qty, t.price, t.side, st.name AS strategy
+    FROM symbols sy CROSS JOIN trades t ON t.symbol_id = sy.id
+    LEFT JOIN demats d ON d.id = t.demat_id
+    LEFT JOIN strategies st ON st.id = t.strategy_id)'''
+POSITION_COLUMNS = ["demat", "strategy", "symbol", "net_qty", "total_qty", "total_cost", "open_cost", "realized_pnl", "last_date"]
+LOT_COLUMNS = ["demat", "strategy", "symbol", "seq", "date", "qty", "price"]
+
+# Running balance for one page of cash_ledger rows: a window over the page,
+# plus each demat's opening balance before its first row on the page. The
+# opening balance is summed from the covering index over whichever side of
+# the page is expected to be shorter: the rows before it for oldest-first
+# pages, or the total less the rows from it onward for newest-first pages.
+# opening is grouped by demat (one row each after rn = 1) only so SQLite
+# cannot flatten it into the join, which would run the sum once per joined
+# row; it is computed once per demat. This works on SQLite before 3.35,
+# which has no MATERIALIZED hint.
+CASH_OPENING_FROM_START = '''(SELECT COALESCE(SUM(c.amount), 0) FROM cash_ledger c
+                                WHERE c.demat = f.demat AND (c.date, c.id) < (f.date, f.id))'''
+CASH_OPENING_FROM_END = '''(SELECT balance FROM cash_balances b WHERE b.demat = f.demat)
+                          - (SELECT COALESCE(SUM(c.amount), 0) FROM cash_ledger c
+                             WHERE c.demat = f.demat AND (c.date, c.id) >= (f.date, f.id))'''
+CASH_PAGE_WITH_BALANCE = '''
+    WITH page AS ({page}),
+    ranked AS (
+        SELECT *, SUM(amount) OVER w AS running, ROW_NUMBER() OVER w AS rn
+        FROM page WINDOW w AS (PARTITION BY demat ORDER BY date, id)
+    ),
+    opening AS (
+        SELECT f.demat, {opening} AS base
+        FROM ranked f WHERE f.rn = 1 GROUP BY f.demat
+    )
+    SELECT r.id, r.date, r.demat, r.amount, r.note, o.base + r.running AS balance
+    FROM ranked r JOIN opening o ON o.demat = r.demat
+    ORDER BY {order}
+'''
+
+def row_hashes(df):
+    """16-byte content hash per row: the transaction fields plus the source row ordinal (df.index).
+
+    Where df["date_from_file"] is False the date was filled in at upload
+    time, so it is left out; the same file uploaded on another day then
+    hashes the same.
+    """
+    dates = df["date"].astype(str)
+    if "date_from_file" in df.columns:
+        dates = dates.where(df["date_from_file"].astype(bool), "")
+    cols = [dates.tolist()] + [df[c].astype(str).tolist() for c in ["demat", "symbol", "qty", "price", "side", "strategy"]]
+    ordinals = [str(i) for i in df.index]
+    return [
+        hashlib.blake2b("\x1f".join(fields).encode(), digest_size=16).digest()
+        for fields in zip(*cols, ordinals)
+    ]
+
+def _where(filters, start_date=None, end_date=None):
+    # filters: {column: value or list of values}; None means no filter
+    clauses, params = [], []
+    for col, value in filters.items():
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            values = list(value)
+            clauses.append(f"{col} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        else:
+            clauses.append(f"{col} = ?")
+            params.append(value)
+    if start_date is not None:
+        clauses.append("date >= ?")
+        params.append(str(start_date))
+    if end_date is not None:
+        clauses.append("date <= ?")
+        params.append(str(end_date))
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+def _select(table, columns, allowed):
+    columns = columns or allowed
+    unknown = set(columns) - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown {table} columns: {sorted(unknown)}")
+    return f"SELECT {', '.join(columns)} FROM {table}"
+
+@timed_methods("db")
 class PortfolioDB:
     def __init__(self, db_file=DB_FILE):
         self.db_file = db_file
+        self.conn = ConnectionManager.for_file(db_file)
         self.init_db()
 
     def init_db(self):
-        conn = sqlite3.connect(self.db_file)
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS transactions (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        date TEXT,
-                        demat TEXT,
-                        symbol TEXT,
-                        qty INTEGER,
-                        price REAL,
-                        side TEXT,
-                        strategy TEXT
-                    )''')
-        c.execute('''CREATE TABLE IF NOT EXISTS cash_ledger (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        date TEXT,
-                        demat TEXT,
-                        amount REAL,
-                        note TEXT
-                    )''')
-        c.execute('''CREATE TABLE IF NOT EXISTS watchlist (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        symbol TEXT,
-                        tag TEXT,
-                        note TEXT
-                    )''')
-        conn.commit()
-        conn.close()
+        # No-op after the first call in this process
+        self.conn.ensure_schema(MIGRATIONS)
+
+    @contextmanager
+    def _write(self):
+        # Every data change bumps the generation in the same transaction, so
+        # cached results keyed on generation() can never outlive the data.
+        with self.conn.transaction() as conn:
+            yield conn
+            self._bump_generation(conn)
 
+    @staticmethod
+    def _bump_generation(conn):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+
+    def generation(self):
+        return self._meta(self.conn.connect(), "generation")
+
+    @staticmethod
+    def _meta(conn, key):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
 
     def insert_transaction(self, date, demat, symbol, qty, price, side, strategy):
-        conn = sqlite3.connect(self.db_file)
-        c = conn.cursor()
-        c.execute('''INSERT INTO transactions (date, demat, symbol, qty, price, side, strategy)
-                     VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                  (date, demat, symbol, qty, price, side, strategy))
-        conn.commit()
-        conn.close()
+        # Manual entries carry no row hash, so they are never treated as duplicates
+        self._insert_transaction_rows([(date, demat, symbol, qty, price, side, strategy, None)])
+
+    def insert_transactions_bulk(self, df):
+        """Insert uploaded rows, skipping any whose row hash (see row_hashes) is already stored.
+
+        df.index must be the source row ordinal. Returns InsertResult(inserted, duplicates).
+        """
+        hashes = df["row_hash"].tolist() if "row_hash" in df.columns else row_hashes(df)
+        frame = df[["date", "demat", "symbol", "qty", "price", "side", "strategy"]]
+        rows = (values + (h,) for values, h in zip(frame.itertuples(index=False, name=None), hashes))
+        return self._insert_transaction_rows(rows)
+
+    def _insert_transaction_rows(self, rows):
+        # Rows land in a per-connection temp table first so dedup, the
+        # transactions insert and the positions update happen in one write
+        # transaction. Duplicate checks are index lookups on row_hash.
+        with self._write() as conn:
+            conn.execute('''CREATE TEMP TABLE IF NOT EXISTS staging_transactions (
+                                date TEXT, demat TEXT, symbol TEXT, qty INTEGER,
+                                price REAL, side TEXT, strategy TEXT, row_hash BLOB
+                            )''')
+            conn.execute("DELETE FROM staging_transactions")
+            staged = conn.executemany('''INSERT INTO staging_transactions (date, demat, symbol, qty, price, side, strategy, row_hash)
+                                         VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', rows).rowcount
+            conn.execute('''DELETE FROM staging_transactions
+                            WHERE row_hash IS NOT NULL AND (
+                                rowid NOT IN (SELECT MIN(rowid) FROM staging_transactions
+                                              WHERE row_hash IS NOT NULL GROUP BY row_hash)
+                                OR EXISTS (SELECT 1 FROM trades t WHERE t.row_hash = staging_transactions.row_hash)
+                            )''')
+            for col, table in DICTIONARIES.items():
+                conn.execute(f"INSERT OR IGNORE INTO {table} (name) SELECT DISTINCT {col} FROM staging_transactions WHERE {col} IS NOT NULL")
+            c = conn.execute('''INSERT OR IGNORE INTO trades (date, demat_id, strategy_id, symbol_id, qty, price, side, row_hash)
+                                SELECT s.date, d.id, st.id, sy.id, s.qty, s.price, s.side, s.row_hash
+                                FROM staging_transactions s
+                                LEFT JOIN demats d ON d.name = s.demat
+                                LEFT JOIN strategies st ON st.name = s.strategy
+                                LEFT JOIN symbols sy ON sy.name = s.symbol
+                                ORDER BY s.rowid''')
+            count = c.rowcount
+            conn.execute(UPSERT_POSITIONS.format(source="staging_transactions"))
+            conn.execute("DELETE FROM staging_transactions")
+        return InsertResult(count, staged - count)
+
+    def compact(self):
+        """Rewrite the database file without free pages, e.g. after the v9
+        migration moved transactions into trades. Returns (bytes before, after)."""
+        conn = self.conn.connect()
+        before = self._file_size(conn)
+        conn.execute("VACUUM")
+        return before, self._file_size(conn)
+
+    @staticmethod
+    def _file_size(conn):
+        return conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+
+    def fetch_positions(self, demat=None, strategy=None, symbol=None, open_only=True):
+        where, params = _where({"demat": demat, "strategy": strategy, "symbol": symbol})
+        if open_only:
+            where += (" AND" if where else " WHERE") + " net_qty > 0"
+        sql = _select("positions", None, POSITION_COLUMNS) + where + " ORDER BY demat, strategy, symbol"
+        return pd.read_sql(sql, self.conn.connect(), params=params)
+
+    def rebuild_positions(self):
+        """Recompute positions from the full transaction history.
+
+        Returns the rows where the maintained table disagreed with the
+        recompute (empty when they matched) and replaces it with the recompute.
+        """
+        with self._write() as conn:
+            conn.execute("DROP TABLE IF EXISTS temp.positions_rebuild")
+            conn.execute(f'''CREATE TEMP TABLE positions_rebuild AS
+                            SELECT demat, strategy, symbol, {POSITION_TOTALS}
+                            FROM transactions
+                            WHERE {POSITION_KEYS_NOT_NULL}
+                            GROUP BY demat, strategy, symbol''')
+            # Full outer join of stored vs recomputed rows
+            diff = pd.read_sql('''
+                SELECT p.demat, p.strategy, p.symbol,
+                       p.net_qty AS stored_net_qty, r.net_qty AS expected_net_qty,
+                       p.total_cost AS stored_total_cost, r.total_cost AS expected_total_cost
+                FROM positions p LEFT JOIN positions_rebuild r USING (demat, strategy, symbol)
+                WHERE r.demat IS NULL OR p.net_qty != r.net_qty OR p.total_qty != r.total_qty
+                      OR ABS(p.total_cost - r.total_cost) > 1e-6 * MAX(1, ABS(r.total_cost))
+                UNION ALL
+                SELECT r.demat, r.strategy, r.symbol, NULL, r.net_qty, NULL, r.total_cost
+                FROM positions_rebuild r LEFT JOIN positions p USING (demat, strategy, symbol)
+                WHERE p.demat IS NULL''', conn)
+            conn.execute("DELETE FROM positions")
+            conn.execute('''INSERT INTO positions (demat, strategy, symbol, net_qty, total_qty, total_cost)
+                            SELECT demat, strategy, symbol, net_qty, total_qty, total_cost FROM positions_rebuild''')
+            conn.execute("DROP TABLE positions_rebuild")
+            # Same transaction, so nobody ever sees the reset cost basis
+            self._sync_lots(conn, full=True)
+        return diff
+
+    def sync_lots(self, full=False):
+        """Run FIFO matching over transactions added since the last sync (or all of them with full=True).
+
+        Only keys with new trades are loaded and rewritten. A key whose new
+        trades are dated before trades already matched is replayed from its
+        full history so FIFO order stays correct. Returns the number of
+        transactions processed.
+        """
+        if not full:
+            conn = self.conn.connect()
+            max_id = conn.execute("SELECT MAX(id) FROM trades").fetchone()[0] or 0
+            if max_id <= self._meta(conn, "lots_watermark"):
+                return 0
+        with self.conn.transaction() as conn:
+            processed = self._sync_lots(conn, full)
+            if processed:
+                self._bump_generation(conn)
+        return processed
+
+    def _sync_lots(self, conn, full):
+        # Body of sync_lots, run inside the caller's write transaction
+        watermark = 0 if full else self._meta(conn, "lots_watermark")
+        max_id = conn.execute("SELECT MAX(id) FROM trades").fetchone()[0] or 0
+        if max_id <= watermark:
+            if full:
+                conn.execute("DELETE FROM lots")
+            return 0
+        trades = pd.read_sql(f'''SELECT id, date, demat, strategy, symbol, qty, price, side FROM transactions
+                                WHERE id > ? AND id <= ? AND {POSITION_KEYS_NOT_NULL}''',
+                             conn, params=[watermark, max_id])
+        if full:
+            conn.execute("DELETE FROM lots")
+            conn.execute("UPDATE positions SET open_cost = 0, realized_pnl = 0, last_date = NULL")
+            engine = LotEngine()
+        else:
+            engine, replay = self._load_lot_state(conn, trades, watermark)
+            if not replay.empty:
+                trades = pd.concat([replay, trades], ignore_index=True)
+            conn.execute('''DELETE FROM lots WHERE (demat, strategy, symbol) IN
+                            (SELECT demat, strategy, symbol FROM sync_keys)''')
+        engine.process(trades)
+        lots = engine.open_lots()
+        conn.executemany(f"INSERT INTO lots ({', '.join(LOT_COLUMNS)}) VALUES ({', '.join('?' * len(LOT_COLUMNS))})",
+                         lots[LOT_COLUMNS].itertuples(index=False, name=None))
+        conn.executemany('''UPDATE positions SET open_cost = ?, realized_pnl = ?, last_date = ?
+                            WHERE demat = ? AND strategy = ? AND symbol = ?''',
+                         engine.positions()[["open_cost", "realized_pnl", "last_date"] + LOT_KEYS].itertuples(index=False, name=None))
+        conn.execute("UPDATE meta SET value = ? WHERE key = 'lots_watermark'", (max_id,))
+        return len(trades)
+
+    def _load_lot_state(self, conn, trades, watermark):
+        # Stage the touched keys, then read back their lots, realized P&L and, for
+        # keys that need a replay, their earlier trades.
+        conn.execute('''CREATE TEMP TABLE IF NOT EXISTS sync_keys (
+                            demat TEXT, strategy TEXT, symbol TEXT, min_date TEXT, replay INTEGER DEFAULT 0,
+                            PRIMARY KEY (demat, strategy, symbol)
+                        )''')
+        conn.execute("DELETE FROM sync_keys")
+        keys = trades.groupby(LOT_KEYS, as_index=False, sort=False)["date"].min()
+        conn.executemany("INSERT INTO sync_keys (demat, strategy, symbol, min_date) VALUES (?, ?, ?, ?)",
+                         keys.itertuples(index=False, name=None))
+        conn.execute('''UPDATE sync_keys SET replay = 1 WHERE min_date < (
+                            SELECT p.last_date FROM positions p
+                            WHERE p.demat = sync_keys.demat AND p.strategy = sync_keys.strategy AND p.symbol = sync_keys.symbol)''')
+        lots = pd.read_sql('''SELECT l.demat, l.strategy, l.symbol, l.date, l.qty, l.price
+                              FROM lots l JOIN sync_keys k USING (demat, strategy, symbol)
+                              WHERE k.replay = 0
+                              ORDER BY l.demat, l.strategy, l.symbol, l.seq''', conn)
+        realized = conn.execute('''SELECT p.demat, p.strategy, p.symbol, p.realized_pnl
+                                   FROM positions p JOIN sync_keys k USING (demat, strategy, symbol)
+                                   WHERE k.replay = 0''').fetchall()
+        replay = pd.read_sql('''SELECT t.id, t.date, t.demat, t.strategy, t.symbol, t.qty, t.price, t.side
+                               FROM transactions t JOIN sync_keys k USING (demat, strategy, symbol)
+                               WHERE k.replay = 1 AND t.id <= ?''', conn,
+                             params=[watermark])
+        engine = LotEngine.from_state(lots, {(d, st, sy): r for d, st, sy, r in realized})
+        return engine, replay
+
+    def fetch_lots(self, demat=None, strategy=None, symbol=None):
+        where, params = _where({"demat": demat, "strategy": strategy, "symbol": symbol})
+        sql = _select("lots", None, LOT_COLUMNS) + where + " ORDER BY demat, strategy, symbol, seq"
+        return pd.read_sql(sql, self.conn.connect(), params=params)
+
+    def fetch_last_prices(self, symbols):
+        # {symbol: (price, updated_at)} for the symbols we have seen before
+        symbols = list(symbols)
+        conn = self.conn.connect()
+        out = {}
+        for i in range(0, len(symbols), MAX_PARAMS):
+            chunk = symbols[i:i + MAX_PARAMS]
+            rows = conn.execute(
+                f"SELECT symbol, price, updated_at FROM prices WHERE symbol IN ({', '.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            out.update({symbol: (price, updated_at) for symbol, price, updated_at in rows})
+        return out
+
+    def save_prices(self, prices, updated_at):
+        with self.conn.transaction() as conn:
+            conn.executemany('''INSERT INTO prices (symbol, price, updated_at) VALUES (?, ?, ?)
+                                ON CONFLICT (symbol) DO UPDATE SET price = excluded.price, updated_at = excluded.updated_at''',
+                             [(s, float(p), updated_at) for s, p in prices.items()])
 
     def insert_cash(self, date, demat, amount, note):
-        conn = sqlite3.connect(self.db_file)
-        c = conn.cursor()
-        c.execute('''INSERT INTO cash_ledger (date, demat, amount, note)
-                     VALUES (?, ?, ?, ?)''',
-                  (date, demat, amount, note))
-        conn.commit()
-        conn.close()
+        with self._write() as conn:
+            conn.execute('''INSERT INTO cash_ledger (date, demat, amount, note)
+                            VALUES (?, ?, ?, ?)''',
+                         (date, demat, amount, note))
+            conn.execute('''INSERT INTO cash_balances (demat, balance) VALUES (?, ?)
+                            ON CONFLICT (demat) DO UPDATE SET balance = balance + excluded.balance''',
+                         (demat, amount))
 
-    def fetch_transactions(self):
-        conn = sqlite3.connect(self.db_file)
-        df = pd.read_sql("SELECT * FROM transactions", conn)
-        conn.close()
+    def query_transactions(self, columns=None, demat=None, strategy=None, symbol=None, start_date=None, end_date=None):
+        """Transactions as a compact frame: demat/strategy/symbol/side are
+        categoricals and qty is int32 where it fits."""
+        columns = columns or TRANSACTION_COLUMNS
+        _select("transactions", columns, TRANSACTION_COLUMNS)
+        where, params = _where({"demat": demat, "strategy": strategy, "symbol": symbol}, start_date, end_date)
+        # Read the integer keys (the view skips joins whose names are unused)
+        # and decode them against the dictionaries once, not per row.
+        selected = [f"{c}_id" if c in DICTIONARIES else c for c in columns]
+        conn = self.conn.connect()
+        df = pd.read_sql(f"SELECT {', '.join(selected)} FROM transactions{where}", conn, params=params)
+        df.columns = columns
+        for col in columns:
+            if col in DICTIONARIES:
+                df[col] = self._decode(conn, DICTIONARIES[col], df[col])
+            elif col == "side":
+                df[col] = df[col].astype("category")
+            elif col == "qty" and len(df) and df[col].notna().all() and df[col].abs().max() < 2 ** 31:
+                df[col] = df[col].astype("int32")
         return df
 
+    @staticmethod
+    def _decode(conn, table, ids):
+        # Categories sorted by name; ids without a name (NULL) become NaN
+        names = conn.execute(f"SELECT id, name FROM {table} ORDER BY name").fetchall()
+        categories = [name for _, name in names]
+        lookup = np.full(max((i for i, _ in names), default=0) + 2, -1, dtype="int32")
+        lookup[[i for i, _ in names]] = np.arange(len(names), dtype="int32")
+        codes = lookup[ids.fillna(-1).to_numpy(dtype="int64")]
+        return pd.Categorical.from_codes(codes, categories=categories)
+
+    def query_cash(self, columns=None, demat=None, start_date=None, end_date=None):
+        where, params = _where({"demat": demat}, start_date, end_date)
+        sql = _select("cash_ledger", columns, CASH_COLUMNS) + where
+        return pd.read_sql(sql, self.conn.connect(), params=params)
+
+    def query_watchlist(self, columns=None, symbol=None, tag=None):
+        where, params = _where({"symbol": symbol, "tag": tag})
+        sql = _select("watchlist", columns, WATCHLIST_COLUMNS) + where
+        return pd.read_sql(sql, self.conn.connect(), params=params)
+
+    def distinct_values(self, table, column):
+        # Cheap lookups for filter widgets; served from the indexes above
+        allowed = {
+            "transactions": ("demat", "strategy", "symbol"),
+            "positions": ("demat", "strategy", "symbol"),
+            "cash_ledger": ("demat",),
+        }
+        if column not in allowed.get(table, ()):
+            raise ValueError(f"Unsupported distinct lookup: {table}.{column}")
+        if table == "transactions":
+            # Trades are never deleted, so every dictionary name is in use
+            sql = f"SELECT name FROM {DICTIONARIES[column]} ORDER BY name"
+        else:
+            sql = f"SELECT DISTINCT {column} FROM {table} ORDER BY {column}"
+        rows = self.conn.connect().execute(sql).fetchall()
+        return [r[0] for r in rows]
+
+    def page(self, table, sort="id", descending=False, after=None, limit=50, **filters):
+        """One page of rows ordered by (sort, id), continuing after the keyset cursor.
+
+        after is the (sort value, id) of the previous page's last row. Returns
+        (rows, next_cursor); next_cursor is None on the last page. Cash ledger
+        rows carry each demat's running balance.
+        """
+        columns, filterable, sortable = PAGE_TABLES[table]
+        if sort not in sortable or any(f not in filterable for f in filters):
+            raise ValueError(f"Unsupported page query on {table}: sort={sort}, filters={list(filters)}")
+        where, params = _where(filters)
+        clauses = [where[len(" WHERE "):]] if where else []
+        op, direction = ("<", "DESC") if descending else (">", "ASC")
+        if after is not None:
+            if sort == "id":
+                clauses.append(f"id {op} ?")
+                params.append(after[1])
+            else:
+                clauses.append(f"({sort}, id) {op} (?, ?)")
+                params.extend(after)
+        order = f"id {direction}" if sort == "id" else f"{sort} {direction}, id {direction}"
+        source = TRANSACTIONS_BY_SYMBOL if (table, sort) == ("transactions", "symbol") else table
+        sql = (f"SELECT {', '.join(c for c in columns if c != 'balance')} FROM {source}"
+               + (" WHERE " + " AND ".join(clauses) if clauses else "")
+               + f" ORDER BY {order} LIMIT ?")
+        if table == "cash_ledger":
+            opening = CASH_OPENING_FROM_END if descending else CASH_OPENING_FROM_START
+            sql = CASH_PAGE_WITH_BALANCE.format(page=sql, order=order, opening=opening)
+        rows = pd.read_sql(sql, self.conn.connect(), params=params + [limit + 1])
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows.iloc[:limit]
+        return rows, (rows[sort].tolist()[-1], int(rows["id"].iloc[-1]))
+
+    def count_rows(self, table, **filters):
+        columns, filterable, _ = PAGE_TABLES[table]
+        if any(f not in filterable for f in filters):
+            raise ValueError(f"Unsupported filter on {table}: {list(filters)}")
+        where, params = _where(filters)
+        return self.conn.connect().execute(f"SELECT COUNT(*) FROM {table}{where}", params).fetchone()[0]
+
+    def iter_transactions(self, chunksize, columns=None):
+        # One statement, so the chunks are a consistent snapshot under WAL
+        sql = _select("transactions", columns, TRANSACTION_COLUMNS) + " ORDER BY id"
+        yield from pd.read_sql(sql, self.conn.connect(), chunksize=chunksize)
+
+    def fetch_transactions(self):
+        return self.query_transactions()
+
     def fetch_cash(self):
-        conn = sqlite3.connect(self.db_file)
-        df = pd.read_sql("SELECT * FROM cash_ledger", conn)
-        conn.close()
-        return df
+        return self.query_cash()
 
     def add_to_watchlist(self, symbol, tag, note):
-        conn = sqlite3.connect(self.db_file)
-        c = conn.cursor()
-        c.execute('''INSERT INTO watchlist (symbol, tag, note) VALUES (?, ?, ?)''', (symbol, tag, note))
-        conn.commit()
-        conn.close()
+        with self._write() as conn:
+            conn.execute('''INSERT INTO watchlist (symbol, tag, note) VALUES (?, ?, ?)''', (symbol, tag, note))
 
     def fetch_watchlist(self):
-        conn = sqlite3.connect(self.db_file)
-        df = pd.read_sql("SELECT * FROM watchlist", conn)
-        conn.close()
-        return df
+        return self.query_watchlist()
 
     def remove_from_watchlist(self, watchlist_id):
-        conn = sqlite3.connect(self.db_file)
-        c = conn.cursor()
-        c.execute('''DELETE FROM watchlist WHERE id = ?''', (watchlist_id,))
-        conn.commit()
-        conn.close()
+        with self._write() as conn:
+            conn.execute('''DELETE FROM watchlist WHERE id = ?''', (watchlist_id,))
@@ -0,0 +1,33 @@
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+# Tests import the app's modules from the repo root, like the benchmarks do
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from db.portfolio_db import MIGRATIONS, PortfolioDB  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    return PortfolioDB(str(tmp_path / "portfolio.db"))
+
+
+@pytest.fixture
+def baseline_db_file(tmp_path):
+    """A database in the original, unversioned schema, with four trades."""
+    path = str(tmp_path / "baseline.db")
+    conn = sqlite3.connect(path)
+    for statement in MIGRATIONS[0][1]:
+        conn.execute(statement)
+    conn.executemany("INSERT INTO transactions (date, demat, symbol, qty, price, side, strategy) VALUES (?, ?, ?, ?, ?, ?, ?)", [
+        ("2024-01-01", "Z", "ABC", 10, 100.0, "BUY", "Swing"),
+        ("2024-01-02", "K", "XYZ", 4, 20.5, "BUY", "Long Term"),
+        ("2024-01-03", "Z", "ABC", 3, 110.0, "SELL", "Swing"),
+        ("2024-01-04", None, "NOKEY", 1, 1.0, "BUY", "Swing"),
+    ])
+    conn.commit()
+    conn.close()
+    return path
@@ -0,0 +1,37 @@
+import pandas as pd
+
+from utils.portfolio_utils import HOLDINGS_CSV_FIELDS, PortfolioUtils
+
+COLUMNS = ["date", "demat", "symbol", "qty", "price", "side", "strategy"]
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def test_reupload_is_all_duplicates(db):
+    upload = frame([
+        ("2024-01-01", "Z", "ABC", 10, 100.0, "BUY", "Swing"),
+        ("2024-01-01", "Z", "ABC", 10, 100.0, "BUY", "Swing"),  # same values, different source row
+        ("2024-01-02", "Z", "XYZ", 5, 50.0, "SELL", "Swing"),
+    ])
+    assert db.insert_transactions_bulk(upload) == (3, 0)
+    assert db.insert_transactions_bulk(upload) == (0, 3)
+    assert len(db.query_transactions()) == 3
+    assert db.fetch_positions(symbol="ABC")["net_qty"].tolist() == [20]
+
+
+def test_holdings_reupload_on_another_day_is_all_duplicates(db):
+    export = pd.DataFrame({"Instrument": ["ABC", "XYZ"], "Qty.": [10, 5], "Avg. cost": [100.0, 20.0]})
+    monday, _ = PortfolioUtils.normalize_holdings(export, HOLDINGS_CSV_FIELDS, "Z", "Long Term", date="2024-01-01")
+    tuesday, _ = PortfolioUtils.normalize_holdings(export, HOLDINGS_CSV_FIELDS, "Z", "Long Term", date="2024-01-02")
+    assert db.insert_transactions_bulk(monday) == (2, 0)
+    assert db.insert_transactions_bulk(tuesday) == (0, 2)
+
+
+def test_trade_dates_from_the_file_are_hashed(db):
+    log = pd.DataFrame({"Symbol": ["ABC"], "Qty": [1], "Price": [10.0], "Side": ["BUY"], "Date": ["2024-01-01"]})
+    first, _ = PortfolioUtils.normalize_trades(log, "Z", "Swing")
+    second, _ = PortfolioUtils.normalize_trades(log.assign(Date="2024-01-02"), "Z", "Swing")
+    assert db.insert_transactions_bulk(first) == (1, 0)
+    assert db.insert_transactions_bulk(second) == (1, 0)
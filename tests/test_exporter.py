@@ -0,0 +1,41 @@
+import os
+import time
+
+import pandas as pd
+
+from utils import exporter
+from utils.exporter import KEEP_ARTIFACTS, ExportManager
+
+HOLDINGS = pd.DataFrame({"symbol": ["ABC"], "net_qty": [10.0]})
+
+
+def build(manager, fmt, generation):
+    return manager.request(fmt, HOLDINGS, generation, 0).result()
+
+
+def test_newer_export_keeps_earlier_files(db, tmp_path):
+    db.insert_transaction("2024-01-01", "Z", "ABC", 10, 100.0, "BUY", "Swing")
+    manager = ExportManager(db)
+    assert manager.export_dir == str(tmp_path / "portfolio_exports")
+    # Another session may still show a download button for generation 1
+    first = build(manager, "csv", 1)
+    second = build(manager, "csv", 2)
+    assert os.path.exists(first) and os.path.exists(second)
+    assert manager.job("csv", 1, 0).result() == first
+
+    paths = [first, second] + [build(manager, "csv", g) for g in range(3, KEEP_ARTIFACTS + 3)]
+    assert [os.path.exists(p) for p in paths] == [False, False] + [True] * KEEP_ARTIFACTS
+    # A pruned artifact is no longer offered, so the page asks to prepare it again
+    assert manager.job("csv", 1, 0) is None
+
+
+def test_prunes_old_files_from_earlier_runs(db, tmp_path):
+    export_dir = tmp_path / "portfolio_exports"
+    export_dir.mkdir()
+    old, recent = export_dir / "export-csv-1-1.zip", export_dir / "export-csv-2-2.zip"
+    for path in (old, recent):
+        path.write_bytes(b"")
+    stale = time.time() - exporter.ORPHAN_MAX_AGE_SECONDS - 60
+    os.utime(old, (stale, stale))
+    ExportManager(db)
+    assert not old.exists() and recent.exists()
@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+from utils.lots import LotEngine
+
+
+def trades(*rows):
+    return pd.DataFrame([("D", "S", "ABC") + row for row in rows],
+                        columns=["demat", "strategy", "symbol", "date", "qty", "price", "side"])
+
+
+def run(*rows):
+    engine = LotEngine()
+    engine.process(trades(*rows))
+    return engine.positions().iloc[0], engine.open_lots()
+
+
+def test_partial_sell_closes_oldest_lot_first():
+    position, lots = run(
+        ("2024-01-01", 10, 100.0, "BUY"),
+        ("2024-01-02", 10, 120.0, "BUY"),
+        ("2024-01-03", 15, 130.0, "SELL"),
+    )
+    assert position["net_qty"] == 5
+    assert position["realized_pnl"] == pytest.approx(10 * 30 + 5 * 10)
+    assert position["open_cost"] == pytest.approx(5 * 120)
+    assert lots[["qty", "price"]].values.tolist() == [[5, 120.0]]
+
+
+def test_trades_are_matched_in_date_order_not_input_order():
+    position, _ = run(
+        ("2024-01-05", 10, 150.0, "BUY"),
+        ("2024-01-20", 10, 200.0, "SELL"),
+        ("2023-12-15", 10, 100.0, "BUY"),
+    )
+    assert position["realized_pnl"] == pytest.approx(10 * (200 - 100))
+    assert position["open_cost"] == pytest.approx(10 * 150)
+
+
+def test_short_is_covered_and_flips_long():
+    position, lots = run(
+        ("2024-01-01", 5, 50.0, "SELL"),
+        ("2024-01-02", 8, 40.0, "BUY"),
+    )
+    assert position["realized_pnl"] == pytest.approx(5 * (50 - 40))
+    assert position["net_qty"] == 3
+    assert lots[["qty", "price"]].values.tolist() == [[3, 40.0]]
+
+
+def test_open_short_keeps_negative_lot():
+    position, lots = run(("2024-01-01", 4, 25.0, "SELL"))
+    assert position["net_qty"] == -4
+    assert position["realized_pnl"] == 0
+    assert lots["qty"].tolist() == [-4]
+
+
+def test_seeded_engine_continues_from_state():
+    first = LotEngine()
+    first.process(trades(("2024-01-01", 10, 100.0, "BUY")))
+    seeded = LotEngine.from_state(first.open_lots(), {("D", "S", "ABC"): 7.0})
+    seeded.process(trades(("2024-01-02", 4, 110.0, "SELL")))
+    position = seeded.positions().iloc[0]
+    assert position["realized_pnl"] == pytest.approx(7.0 + 4 * 10)
+    assert position["net_qty"] == 6
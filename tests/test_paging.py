@@ -0,0 +1,41 @@
+import random
+
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def ledger(db):
+    rng = random.Random(0)
+    for _ in range(60):
+        # Few distinct dates, so pages break inside runs of equal dates
+        db.insert_cash(f"2024-01-{rng.randint(1, 9):02d}", rng.choice(["Z", "U", "K"]), round(rng.uniform(-500, 1000), 2), "n")
+    return db
+
+
+def walk(db, table, limit, **kwargs):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = db.page(table, after=cursor, limit=limit, **kwargs)
+        assert len(rows) <= limit
+        pages.append(rows)
+        if cursor is None:
+            return pd.concat(pages, ignore_index=True)
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("demat", [None, ["U"], ["Z", "K"]])
+def test_cash_ledger_pages_carry_running_balance(ledger, descending, demat):
+    expected = ledger.query_cash().sort_values(["date", "id"])
+    # Balances run over each demat's whole ledger, whatever the filter
+    expected["balance"] = expected.groupby("demat")["amount"].cumsum()
+    if demat:
+        expected = expected[expected["demat"].isin(demat)]
+    if descending:
+        expected = expected.iloc[::-1]
+
+    filters = {"demat": demat} if demat else {}
+    got = walk(ledger, "cash_ledger", 7, sort="date", descending=descending, **filters)
+    assert got["id"].tolist() == expected["id"].tolist()
+    assert got["balance"].to_numpy() == pytest.approx(expected["balance"].to_numpy())
+    assert ledger.count_rows("cash_ledger", **filters) == len(expected)
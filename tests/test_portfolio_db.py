@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from db.portfolio_db import PortfolioDB
+
+COLUMNS = ["date", "demat", "symbol", "qty", "price", "side", "strategy"]
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def lot_state(db):
+    positions = db.fetch_positions(open_only=False)[["demat", "strategy", "symbol", "net_qty", "open_cost", "realized_pnl"]]
+    return positions, db.fetch_lots()[["demat", "strategy", "symbol", "seq", "date", "qty", "price"]]
+
+
+def test_incremental_sync_matches_full_replay(db):
+    db.insert_transactions_bulk(frame([
+        ("2024-01-02", "Z", "ABC", 10, 100.0, "BUY", "Swing"),
+        ("2024-01-10", "Z", "ABC", 5, 130.0, "SELL", "Swing"),
+        ("2024-01-03", "Z", "XYZ", 3, 10.0, "BUY", "Swing"),
+    ]))
+    db.sync_lots()
+    # Backdated buy for ABC (replayed from full history) and a new trade for XYZ (incremental)
+    db.insert_transaction("2024-01-01", "Z", "ABC", 10, 80.0, "BUY", "Swing")
+    db.insert_transaction("2024-01-04", "Z", "XYZ", 1, 12.0, "SELL", "Swing")
+    assert db.sync_lots() > 0
+    incremental = lot_state(db)
+
+    abc = db.fetch_positions(symbol="ABC").iloc[0]
+    assert abc["realized_pnl"] == pytest.approx(5 * (130 - 80))
+    assert abc["open_cost"] == pytest.approx(5 * 80 + 10 * 100)
+
+    assert db.rebuild_positions().empty
+    full = lot_state(db)
+    pd.testing.assert_frame_equal(incremental[0], full[0])
+    pd.testing.assert_frame_equal(incremental[1], full[1])
+
+
+def test_sync_bumps_generation_only_when_lots_change(db):
+    db.insert_transaction("2024-01-01", "Z", "ABC", 1, 1.0, "BUY", "Swing")
+    before = db.generation()
+    assert db.sync_lots() == 1
+    assert db.generation() == before + 1
+    assert db.sync_lots() == 0
+    assert db.generation() == before + 1
+
+
+def test_sync_lots_on_migrated_baseline(baseline_db_file):
+    db = PortfolioDB(baseline_db_file)
+    db.sync_lots()
+    abc = db.fetch_positions(symbol="ABC").iloc[0]
+    assert abc["net_qty"] == 7
+    assert abc["realized_pnl"] == pytest.approx(3 * 10)
+    assert abc["open_cost"] == pytest.approx(7 * 100)
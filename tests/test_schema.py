@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+from db.portfolio_db import MIGRATIONS, PortfolioDB
+from utils.portfolio_utils import PortfolioUtils
+
+COLUMNS = ["date", "demat", "symbol", "qty", "price", "side", "strategy"]
+
+
+def test_migrates_baseline_to_dictionary_encoded_trades(baseline_db_file):
+    db = PortfolioDB(baseline_db_file)
+    conn = db.conn.connect()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == MIGRATIONS[-1][0]
+    assert conn.execute("SELECT type FROM sqlite_master WHERE name = 'transactions'").fetchone()[0] == "view"
+
+    tx = db.query_transactions()
+    assert tx["id"].tolist() == [1, 2, 3, 4]
+    assert tx["symbol"].astype(object).tolist() == ["ABC", "XYZ", "ABC", "NOKEY"]
+    assert tx["demat"].isna().tolist() == [False, False, False, True]
+    assert isinstance(tx["symbol"].dtype, pd.CategoricalDtype)
+    assert str(tx["qty"].dtype) == "int32"
+    assert db.distinct_values("transactions", "demat") == ["K", "Z"]
+    assert db.query_transactions(demat="Z", symbol="ABC")["qty"].tolist() == [10, 3]
+
+    new = pd.DataFrame([("2024-02-01", "N", "NEW", 2, 5.0, "BUY", "Swing")], columns=COLUMNS)
+    assert db.insert_transactions_bulk(new) == (1, 0)
+    assert db.query_transactions(demat="N")["id"].tolist() == [5]
+
+
+def test_symbol_pages_match_the_view_order(db):
+    db.insert_transactions_bulk(pd.DataFrame(
+        [("2024-01-01", "ZK"[i % 2], f"S{i % 7}", i + 1, 1.0, "BUY", "Swing") for i in range(40)], columns=COLUMNS))
+    conn = db.conn.connect()
+    for descending in (False, True):
+        for demat in (None, ["K"]):
+            direction = "DESC" if descending else "ASC"
+            where = " WHERE demat = 'K'" if demat else ""
+            expected = [r[0] for r in conn.execute(
+                f"SELECT id FROM transactions{where} ORDER BY symbol {direction}, id {direction}")]
+            got, cursor = [], None
+            while True:
+                filters = {"demat": demat} if demat else {}
+                rows, cursor = db.page("transactions", "symbol", descending, cursor, 6, **filters)
+                got += rows["id"].tolist()
+                if cursor is None:
+                    break
+            assert got == expected
+
+
+@pytest.mark.parametrize("calculate", [PortfolioUtils.calculate_holdings, PortfolioUtils.calculate_fifo_holdings])
+def test_holdings_from_categorical_transactions(db, calculate):
+    # Three demats x two strategies x three symbols as categories, but only three keys traded
+    db.insert_transactions_bulk(pd.DataFrame([
+        ("2024-01-01", "Z", "ABC", 10, 100.0, "BUY", "Swing"),
+        ("2024-01-02", "K", "XYZ", 4, 20.0, "BUY", "Long Term"),
+        ("2024-01-03", "U", "QRS", 2, 50.0, "BUY", "Swing"),
+    ], columns=COLUMNS))
+    prices = {"ABC": 110.0, "XYZ": 25.0, "QRS": 40.0}
+    categorical = db.query_transactions()
+    plain = categorical.astype({c: object for c in ["demat", "strategy", "symbol", "side"]})
+    holdings = calculate(categorical, prices)
+    assert len(holdings) == 3
+    pd.testing.assert_frame_equal(holdings.reset_index(drop=True), calculate(plain, prices).reset_index(drop=True))
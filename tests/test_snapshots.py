@@ -0,0 +1,73 @@
+import multiprocessing
+
+import pandas as pd
+import pytest
+
+from db.portfolio_db import PortfolioDB
+from utils.price_provider import MockPriceProvider
+from utils.snapshots import SnapshotStore
+
+
+def test_take_on_empty_db(db, tmp_path):
+    store = SnapshotStore(str(tmp_path / "snapshots"))
+    taken = store.take(db, MockPriceProvider(), "2024-01-01")
+    assert (taken.positions, taken.groups, taken.cash) == (0, 0, 0)
+
+
+def test_take_with_cash_only(db, tmp_path):
+    db.insert_cash("2024-01-01", "Z", 1000.0, "deposit")
+    store = SnapshotStore(str(tmp_path / "snapshots"))
+    taken = store.take(db, MockPriceProvider(), "2024-01-02")
+    assert (taken.groups, taken.cash) == (0, 1)
+    history = store.nav_series()
+    assert history["nav"].tolist() == [1000.0]
+
+
+def _take(db_file, root, date, results):
+    taken = SnapshotStore(root).take(PortfolioDB(db_file), MockPriceProvider(), date)
+    results.put(taken is not None)
+
+
+def test_concurrent_processes_append_one_snapshot(db, tmp_path):
+    db.insert_transactions_bulk(pd.DataFrame(
+        [("2024-01-01", "Z", f"S{i}", 1, 10.0, "BUY", "Swing") for i in range(50)],
+        columns=["date", "demat", "symbol", "qty", "price", "side", "strategy"]))
+    root = str(tmp_path / "snapshots")
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_take, args=(db.db_file, root, "2024-01-02", results)) for _ in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(60)
+    assert sorted(results.get(timeout=5) for _ in workers) == [False, False, False, True]
+    store = SnapshotStore(root)
+    assert len(store.positions) == 50
+    assert store.positions.frame()["symbol"].nunique() == 50
+
+
+def test_take_finishes_a_day_interrupted_part_way(db, tmp_path, monkeypatch):
+    db.insert_transaction("2024-01-01", "Z", "ABC", 10, 100.0, "BUY", "Swing")
+    db.insert_cash("2024-01-01", "Z", 5000.0, "deposit")
+    root = str(tmp_path / "snapshots")
+    store = SnapshotStore(root)
+    store.take(db, MockPriceProvider(), "2024-01-01")
+
+    # The process dies after the groups table is appended, before cash
+    def crash(frame):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(store.cash, "append", crash)
+    try:
+        store.take(db, MockPriceProvider(), "2024-01-02")
+    except KeyboardInterrupt:
+        pass
+
+    store = SnapshotStore(root)
+    assert store.last_date().isoformat() == "2024-01-01"
+    assert store.version() == (1, 1, 1)
+    taken = store.take(db, MockPriceProvider(), "2024-01-02")
+    assert (taken.groups, taken.cash) == (1, 1)
+    assert store.version() == (2, 2, 2)
+    # Nothing changed between the days, so neither did NAV (no missing cash balance)
+    nav = SnapshotStore(root).nav_series()["nav"].tolist()
+    assert nav[1] == pytest.approx(nav[0])
@@ -0,0 +1,52 @@
+import streamlit as st
+import pandas as pd
+from utils import profiling
+
+@st.cache_resource
+def get_ui():
+    return DiagnosticsUI()
+
+class DiagnosticsUI:
+    def diagnostics(self):
+        st.subheader("Performance Diagnostics")
+        if not profiling.ENABLED:
+            st.info("Profiling is off (STOX_PROFILE=0).")
+            return
+        profiler = profiling.PROFILER
+        spans = pd.DataFrame(profiler.records(), columns=profiling.SPAN_FIELDS)
+        # Leave out this page's own rerun, which is still in progress
+        spans = spans[spans["run"] < profiler.run]
+        if spans.empty:
+            st.info("No timings recorded yet. Visit another page first.")
+            return
+
+        runs = sorted(spans["run"].unique().tolist(), reverse=True)
+        run = st.selectbox("Rerun", runs, format_func=lambda r: f"#{r} {profiler.run_labels.get(r) or ''}")
+        current = spans[spans["run"] == run].sort_values("started_at", kind="stable")
+        breakdown = current.groupby("name").agg(
+            calls=("duration_ms", "size"),
+            total_ms=("duration_ms", "sum"),
+            rows=("rows", "sum"),
+            rss_delta_kb=("rss_delta_kb", "sum"),
+        ).sort_values("total_ms", ascending=False)
+        st.markdown("**Breakdown for this rerun**")
+        st.bar_chart(breakdown["total_ms"])
+        st.dataframe(breakdown)
+        st.markdown("**Spans**")
+        timeline = current.assign(span=["  " * d + n for d, n in zip(current["depth"], current["name"])])
+        st.dataframe(timeline[["span", "duration_ms", "rows", "rss_delta_kb", "thread"]].reset_index(drop=True))
+
+        st.markdown(f"**Latency over the last {spans['run'].nunique()} reruns**")
+        latency = spans.groupby("name")["duration_ms"].agg(
+            calls="size",
+            p50_ms=lambda d: d.quantile(0.5),
+            p95_ms=lambda d: d.quantile(0.95),
+            max_ms="max",
+        ).round(3).sort_values("p95_ms", ascending=False)
+        st.dataframe(latency)
+
+        col1, col2 = st.columns(2)
+        col1.download_button("Download timings (JSON)", profiler.to_json(), "stox_profile.json", "application/json")
+        if col2.button("Clear timings"):
+            profiler.clear()
+            st.rerun()
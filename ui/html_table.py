@@ -0,0 +1,35 @@
+import numpy as np
+
+CELL_STYLE = "border:1px solid #ddd;padding:4px;"
+HEADER_STYLE = "border:1px solid #ddd;padding:4px;text-align:left"
+
+
+def _column_style(col, values, color_col, color):
+    # Same rules as the old per-cell get_style, evaluated once per column
+    if col == color_col:
+        return f"color:{color};font-weight:bold;"
+    if col == "allocation_%":
+        return np.where(values > 0, "color:blue;font-weight:bold;", "")
+    if col == "investment":
+        return np.where(values > 0, "color:orange;font-weight:bold;", "")
+    if col == "pnl":
+        return np.where(values > 0, "color:green;font-weight:bold;", "color:red;font-weight:bold;")
+    return ""
+
+
+def render_table(df, color_col, color):
+    """HTML table for st.markdown, styled per column rather than per cell."""
+    if df.empty:
+        return "<i>No data</i>"
+    header = "".join(f"<th style='{HEADER_STYLE}'>{col}</th>" for col in df.columns)
+    columns = []
+    for col in df.columns:
+        values = df[col].to_numpy()
+        style = _column_style(col, values, color_col, color)
+        if isinstance(style, str):
+            prefix = f"<td style='{CELL_STYLE}{style}'>"
+            columns.append([prefix + str(v) + "</td>" for v in values.tolist()])
+        else:
+            columns.append([f"<td style='{CELL_STYLE}{s}'>{v}</td>" for s, v in zip(style.tolist(), values.tolist())])
+    body = "".join("<tr>" + "".join(cells) + "</tr>" for cells in zip(*columns))
+    return '<table style="width:100%;border-collapse:collapse;">' + "<tr>" + header + "</tr>" + body + "</table>"
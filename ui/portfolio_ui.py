@@ -1,222 +1,109 @@
 import streamlit as st
 import pandas as pd
 import datetime
-from db.portfolio_db import PortfolioDB
+import functools
+from db.portfolio_db import PAGE_TABLES
 from utils.portfolio_utils import PortfolioUtils
-from io import BytesIO
+from utils import profiling
+from ui.resources import get_db, get_price_provider, get_result_cache, get_snapshot_store, get_export_manager
+
+# Modules only one page needs (exporter, snapshots, performance, averaging,
+# html_table) are imported inside it. openpyxl, xlsxwriter and pyarrow.parquet
+# load lazily inside importer/exporter. Upload and Diagnostics live in their
+# own modules (ui/upload_ui.py, ui/diagnostics_ui.py).
+
+@st.cache_resource
+def get_ui():
+    # Holds no per-session state (that lives in st.session_state), so one
+    # instance serves every rerun and session
+    return PortfolioUI()
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def price_signature(prices):
+    return hash(frozenset(prices.items()))
 
 class PortfolioUI:
-    def get_top_performers(self, holdings, group_by=None, top_n=3, ascending=False):
-        df = holdings.sort_values("pnl_pct", ascending=ascending)
-        if group_by:
-            df = df.groupby(group_by).head(top_n).copy()
-        else:
-            df = df.head(top_n).copy()
-        total_value = df["current_value"].sum()
-        df["allocation_%"] = (df["current_value"] / total_value * 100).round(2) if total_value != 0 else 0
-        df["investment"] = df["investment"]
-        # Select columns based on group_by
-        cols = ["symbol", "pnl_pct", "allocation_%", "investment"]
-        if group_by:
-            cols.insert(1, group_by)
-        else:
-            cols = ["symbol", "strategy", "demat", "pnl_pct", "allocation_%", "investment"]
-        return df[cols].reset_index(drop=True)
-    def __init__(self):
-        self.db = PortfolioDB()
-        self.utils = PortfolioUtils()
+    # Built the first time a page uses them: Transactions, Cash Ledger and
+    # Watchlist never create the price provider
+    @functools.cached_property
+    def db(self):
+        return get_db()
 
-    def sidebar(self):
-        return st.sidebar.radio("Navigation", ["Upload Trades", "Upload Holdings", "Portfolio", "Cash Ledger", "Export", "Watchlist"])
+    @functools.cached_property
+    def prices(self):
+        return get_price_provider()
 
-    def upload_holdings(self):
-        st.subheader("Upload Initial Holdings File (CSV/XLSX)")
-        file = st.file_uploader("Choose file", type=["csv", "xlsx"], key="holdings")
-        demat = st.text_input("Enter Demat", "Zerodha")
-        strategy = st.text_input("Enter Strategy", "Long Term")
-        if file:
-            try:
-                if file.name.endswith(".csv"):
-                    df = pd.read_csv(file)
-                    symbol_fields = ["Instrument", "Name", "symbol", "Symbol"]
-                    qty_fields = ["Qty.", "Qty", "quantity"]
-                    price_fields = ["Avg. cost", "Avg.", "ATP", "avg_price", "Price"]
-                else:
-                    df = pd.read_excel(file)
-                    # Excel fields: Name, Exchange, Status, Action, Qty, ATP, LTP, LTP %, Gain/loss, Gain/loss %
-                    # Also support: Client ID, Company Name, ISIN, MarketCap, Sector, Total Quantity, Avg Trading Price, LTP, Invested Value, Market Value, Overall Gain/Loss
-                    symbol_fields = ["Company Name", "Name", "Instrument", "symbol", "Symbol"]
-                    qty_fields = ["Total Quantity", "Qty", "Qty.", "quantity"]
-                    price_fields = ["Avg Trading Price", "ATP", "Avg.", "Avg. cost", "Price", "avg_price"]
-                st.dataframe(df.head())
-            except Exception as e:
-                st.error(f"Error reading file: {e}")
-                return
-            date = datetime.date.today().isoformat()
-            if st.button("Upload as Transactions"):
-                errors = []
-                success_count = 0
-                for idx, row in df.iterrows():
-                    symbol = next((row.get(f) for f in symbol_fields if row.get(f) is not None), None)
-                    qty_val = next((row.get(f) for f in qty_fields if row.get(f) is not None), None)
-                    price_val = next((row.get(f) for f in price_fields if row.get(f) is not None), None)
-                    # fallback for Zerodha positions: sometimes qty is like '12 Shares'
-                    if isinstance(qty_val, str) and "Share" in qty_val:
-                        try:
-                            qty_val = int(qty_val.split()[0])
-                        except Exception:
-                            qty_val = None
-                    if not symbol or qty_val is None or price_val is None:
-                        row_num = idx
-                        errors.append(f"Row {row_num}: Missing required fields.")
-                        continue
-                    try:
-                        qty = int(qty_val)
-                        price = float(price_val)
-                        self.db.insert_transaction(date, demat, symbol, qty, price, "BUY", strategy)
-                        success_count += 1
-                    except Exception as e:
-                        row_num = idx
-                        errors.append(f"Row {row_num}: {e}")
-                if success_count:
-                    st.success(f"{success_count} holdings uploaded as BUY transactions.")
-                if errors:
-                    st.error("Some rows failed to upload:")
-                    for err in errors:
-                        st.write(err)
+    @functools.cached_property
+    def cache(self):
+        return get_result_cache()
 
-    def upload_trades(self):
-        st.subheader("Upload Daily Trade Log (CSV/XLSX)")
-        file = st.file_uploader("Choose trade log", type=["csv", "xlsx"])
-        demat = st.text_input("Enter Demat", "Zerodha")
-        strategy = st.text_input("Enter Strategy", "Swing")
-        if file:
-            try:
-                df = pd.read_csv(file) if file.name.endswith(".csv") else pd.read_excel(file)
-                st.dataframe(df.head())
-            except Exception as e:
-                st.error(f"Error reading file: {e}")
-                return
-            if st.button("Upload Trades"):
-                errors = []
-                success_count = 0
-                for idx, row in df.iterrows():
-                    symbol = row.get("Symbol") or row.get("symbol")
-                    qty_val = row.get("Qty") or row.get("quantity")
-                    price_val = row.get("Price") or row.get("price")
-                    side = row.get("Side") or row.get("side") or "BUY"
-                    if not symbol or qty_val is None or price_val is None:
-                        row_num = idx
-                        errors.append(f"Row {row_num}: Missing required fields.")
-                        continue
-                    try:
-                        qty = int(qty_val)
-                        price = float(price_val)
-                        self.db.insert_transaction(str(row.get("Date") or datetime.date.today()), demat, symbol, qty, price, side.upper(), strategy)
-                        success_count += 1
-                    except Exception as e:
-                        row_num = idx
-                        errors.append(f"Row {row_num}: {e}")
-                if success_count:
-                    st.success(f"{success_count} trades uploaded.")
-                if errors:
-                    st.error("Some rows failed to upload:")
-                    for err in errors:
-                        st.write(err)
+    @functools.cached_property
+    def exports(self):
+        return get_export_manager()
+
+    @functools.cached_property
+    def snapshots(self):
+        return get_snapshot_store()
+
+    def cached(self, name, *key, compute):
+        # Results are reused until a write bumps the generation or the key (filters, prices) changes
+        return self.cache.get_or_compute((name, self.db.db_file, self.db.generation()) + key, compute)
 
     def portfolio(self):
         st.subheader("Portfolio Overview")
-        tx = self.db.fetch_transactions()
-        if tx.empty:
-            st.info("No transactions yet.")
-        symbols = tx["symbol"].unique().tolist()
-        prices = self.utils.get_mock_prices(symbols)
+        self.db.sync_lots()
+        col1, col2 = st.columns(2)
+        demat_options = self.cached("distinct", "demat", compute=lambda: self.db.distinct_values("positions", "demat"))
+        strategy_options = self.cached("distinct", "strategy", compute=lambda: self.db.distinct_values("positions", "strategy"))
+        demats = col1.multiselect("Demat", demat_options)
+        strategies = col2.multiselect("Strategy", strategy_options)
+        filters = (tuple(demats), tuple(strategies))
+        # Closed positions are kept for their realized P&L
+        positions = self.cached("positions", filters, compute=lambda: self.db.fetch_positions(demat=demats or None, strategy=strategies or None, open_only=False))
+        if positions.empty:
+            st.info("No open positions.")
+            return
+        symbols = positions.loc[positions["net_qty"] > 0, "symbol"].unique().tolist()
+        prices = self.prices.get_prices(symbols)
+        price_key = price_signature(prices)
         try:
-            holdings = self.utils.calculate_holdings(tx, prices)
+            holdings = self.cached("holdings", filters, price_key, compute=lambda: PortfolioUtils.holdings_from_positions(positions, prices))
         except Exception as e:
             st.error(f"Error calculating holdings: {e}")
             return
         if holdings.empty:
             st.info("No open positions.")
             return
-        tab1, tab2, tab3, tab4 = st.tabs(["By Strategy", "By Demat", "Overall Portfolio", "Averaging Candidates"])
+        realized = positions["realized_pnl"].sum()
+        summary = self.cached("portfolio_summary", filters, price_key, compute=lambda: self.portfolio_summary(holdings, realized))
+        tab1, tab2, tab3, tab4, tab5 = st.tabs(["By Strategy", "By Demat", "Overall Portfolio", "Averaging Candidates", "History"])
         with tab1:
-            strat_group = holdings.groupby(["strategy"], as_index=False).agg({
-                "pnl": "sum",
-                "pnl_pct": "mean",
-                "current_value": "sum",
-                "net_qty": "sum"
-            })
-            total_value = strat_group["current_value"].sum()
-            strat_group["allocation_%"] = (strat_group["current_value"] / total_value * 100).round(2) if total_value != 0 else 0
-            st.dataframe(strat_group, use_container_width=True)
+            st.dataframe(summary["strategy"], use_container_width=True)
             st.write("#### Top Winners (by Strategy)")
-            winners_strat = self.get_top_performers(holdings, group_by="strategy", top_n=3, ascending=False)
-            st.markdown(self.df_to_html(winners_strat, 'pnl_pct', 'green'), unsafe_allow_html=True)
+            st.markdown(summary["winners_strategy"], unsafe_allow_html=True)
             st.write("#### Top Losers (by Strategy)")
-            losers_strat = self.get_top_performers(holdings, group_by="strategy", top_n=3, ascending=True)
-            st.markdown(self.df_to_html(losers_strat, 'pnl_pct', 'red'), unsafe_allow_html=True)
+            st.markdown(summary["losers_strategy"], unsafe_allow_html=True)
         with tab2:
-            demat_group = holdings.groupby(["demat"], as_index=False).agg({
-                "pnl": "sum",
-                "pnl_pct": "mean",
-                "current_value": "sum",
-                "net_qty": "sum"
-            })
-            total_value = demat_group["current_value"].sum()
-            demat_group["allocation_%"] = (demat_group["current_value"] / total_value * 100).round(2) if total_value != 0 else 0
-            st.dataframe(demat_group, use_container_width=True)
+            st.dataframe(summary["demat"], use_container_width=True)
             st.write("#### Top Winners (by Demat)")
-            winners_demat = self.get_top_performers(holdings, group_by="demat", top_n=3, ascending=False)
-            st.markdown(self.df_to_html(winners_demat, 'pnl_pct', 'green'), unsafe_allow_html=True)
+            st.markdown(summary["winners_demat"], unsafe_allow_html=True)
             st.write("#### Top Losers (by Demat)")
-            losers_demat = self.get_top_performers(holdings, group_by="demat", top_n=3, ascending=True)
-            st.markdown(self.df_to_html(losers_demat, 'pnl_pct', 'red'), unsafe_allow_html=True)
+            st.markdown(summary["losers_demat"], unsafe_allow_html=True)
         with tab3:
             st.write("### Overall Portfolio")
-            overall_group = holdings.agg({
-                "investment": "sum",
-                "current_value": "sum",
-                "pnl": "sum",
-                "net_qty": "sum"
-            })
-            pnl_pct = (overall_group["pnl"] / overall_group["investment"] * 100) if overall_group["investment"] != 0 else 0
-            num_holdings = len(holdings)
-            avg_holding_size = overall_group["net_qty"] / num_holdings if num_holdings > 0 else 0
-            metrics_table = pd.DataFrame({
-                "Metric": [
-                    "Total Invested",
-                    "Current Value",
-                    "PnL",
-                    "PnL %",
-                    "Number of Holdings",
-                    "Avg Holding Size"
-                ],
-                "Value": [
-                    f"₹{overall_group['investment']:.2f}",
-                    f"₹{overall_group['current_value']:.2f}",
-                    f"₹{overall_group['pnl']:.2f}",
-                    f"{pnl_pct:.2f}%",
-                    f"{num_holdings}",
-                    f"{avg_holding_size:.2f}"
-                ]
-            })
-            st.table(metrics_table)
-            holdings_disp = holdings.copy().reset_index(drop=True)
-            total_value = holdings_disp["current_value"].sum()
-            holdings_disp["allocation_%"] = (holdings_disp["current_value"] / total_value * 100).round(2) if total_value != 0 else 0
-            st.dataframe(holdings_disp.reset_index(drop=True), use_container_width=True)
+            st.table(summary["metrics"])
+            st.dataframe(summary["holdings"], use_container_width=True)
             st.markdown("---")
             st.write("#### Top Winners (Overall)")
-            winners = self.get_top_performers(holdings, group_by=None, top_n=5, ascending=False)
-            st.markdown(self.df_to_html(winners, 'pnl_pct', 'green'), unsafe_allow_html=True)
+            st.markdown(summary["winners"], unsafe_allow_html=True)
             st.write("#### Top Losers (Overall)")
-            losers = self.get_top_performers(holdings, group_by=None, top_n=5, ascending=True)
-            st.markdown(self.df_to_html(losers, 'pnl_pct', 'red'), unsafe_allow_html=True)
+            st.markdown(summary["losers"], unsafe_allow_html=True)
             st.markdown("---")
         with tab4:
             threshold = st.slider("Averaging Trigger % (CMP below Avg Price)", 1, 50, 10)
-            signal_rule = 1 - (threshold / 100)
             # Auto-detect price column
             price_col = None
             for col in ["cmp", "current_price", "price", "ltp", "close", "market_price"]:
@@ -224,36 +111,19 @@ class PortfolioUI:
                     price_col = col
                     break
             if price_col and "avg_price" in holdings.columns:
-                candidates = holdings[holdings[price_col] < holdings["avg_price"] * signal_rule].copy().reset_index(drop=True)
-                candidates["cmp_drop_%"] = ((candidates["avg_price"] - candidates[price_col]) / candidates["avg_price"] * 100).round(2)
-                # Averaging simulation logic
-                def get_buy_qty(row):
-                    if row["cmp_drop_%"] >= 10:
-                        return row["net_qty"] * 0.5
-                    elif row["cmp_drop_%"] >= 6:
-                        return row["net_qty"] * 0.4
-                    elif row["cmp_drop_%"] >= 3:
-                        return row["net_qty"] * 0.3
-                    else:
-                        return 0
-                candidates["buy_qty"] = candidates.apply(get_buy_qty, axis=1).round(0)
-                candidates["funds_required"] = (candidates["buy_qty"] * candidates[price_col]).round(2)
-                candidates["new_qty"] = (candidates["net_qty"] + candidates["buy_qty"]).round(0)
-                candidates["new_investment"] = (candidates["investment"] + candidates["funds_required"]).round(2)
-                candidates["new_avg_price"] = candidates.apply(lambda row: round(row["new_investment"] / row["new_qty"], 2) if row["new_qty"] > 0 else row["avg_price"], axis=1)
+                from utils import averaging
+                candidates = averaging.candidates(holdings, threshold, averaging.DEFAULT_TIERS, price_col)
                 show_cols = [
                     "symbol", price_col, "avg_price", "cmp_drop_%", "net_qty", "investment", # before
                     "buy_qty", "funds_required", "new_qty", "new_investment", "new_avg_price" # after
                 ]
-                # Color coding for new vs old columns
-                def highlight_cols(val, col):
-                    if col in ["buy_qty", "funds_required", "new_qty", "new_investment", "new_avg_price"]:
-                        return "background-color: #e6ffe6; font-weight: bold;"  # light green for new
-                    elif col in ["net_qty", "investment", "avg_price"]:
-                        return "background-color: #f0f0f0;"  # light gray for old
-                    return ""
+                # Color coding for new vs old columns; styles are set per column, not per row
                 def style_df(df):
-                    return df.style.apply(lambda x: [highlight_cols(x[col], col) for col in df.columns], axis=1)
+                    return (df.style
+                            .set_properties(subset=["buy_qty", "funds_required", "new_qty", "new_investment", "new_avg_price"],
+                                            **{"background-color": "#e6ffe6", "font-weight": "bold"})  # light green for new
+                            .set_properties(subset=["net_qty", "investment", "avg_price"],
+                                            **{"background-color": "#f0f0f0"}))  # light gray for old
 
                 st.write(f"### Averaging Candidates ({len(candidates)})")
                 if not candidates.empty:
@@ -270,35 +140,127 @@ class PortfolioUI:
                         st.dataframe(style_df(group[show_cols]), use_container_width=True)
                 else:
                     st.info("No averaging candidates found for the selected threshold.")
+                self.averaging_scenarios(holdings, price_col, filters, price_key)
             elif not price_col:
                 st.info("No price column (current_price, price, ltp, close, market_price) found in holdings.")
             else:
                 st.info("No avg_price column found in holdings.")
+        with tab5:
+            self.history(demats, strategies)
+
+    def history(self, demats, strategies):
+        from utils import performance
+        # Reads the snapshot store only; transactions are never replayed here
+        store = self.snapshots
+        if st.button("Take today's snapshot"):
+            try:
+                taken = store.take(self.db, self.prices)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.success(f"Snapshot saved for {taken.date}." if taken else "Today's snapshot was already taken.")
+        store.refresh()
+        dates = store.dates()
+        if not len(dates):
+            st.info("No snapshots yet. Take one above, or schedule `python cli.py snapshot` to run daily.")
+            return
+        first, last = pd.Timestamp(dates[0]).date(), pd.Timestamp(dates[-1]).date()
+        picked = st.date_input("Range", (first, last), min_value=first, max_value=last)
+        start, end = (picked + (last,))[:2] if isinstance(picked, tuple) else (picked, last)
+        filters = (tuple(demats), tuple(strategies))
+        metrics = self.cached("nav_history", filters, store.version(), start, end, compute=lambda: performance.summarize(
+            store.nav_series(demats or None, strategies or None, start, end)))
+        if metrics["series"].empty:
+            st.info("No snapshots in the selected range.")
+            return
+        if strategies:
+            st.caption("Strategy views exclude cash: flows are the net cash traded in or out of the selected strategies.")
+
+        def pct(value):
+            return "n/a" if value is None else f"{value * 100:.2f}%"
+        col1, col2, col3, col4, col5 = st.columns(5)
+        col1.metric("TWR", pct(metrics["twr"]))
+        col2.metric("TWR (annualized)", pct(metrics["twr_annualized"]))
+        col3.metric("XIRR", pct(metrics["xirr"]))
+        col4.metric("Max Drawdown", pct(metrics["max_drawdown"]))
+        col5.metric("Current Drawdown", pct(metrics["current_drawdown"]))
+        st.write("#### NAV")
+        st.line_chart(metrics["series"]["nav"])
+        st.write("#### Drawdown %")
+        st.area_chart(metrics["series"]["drawdown_%"])
+        if not metrics["episodes"].empty:
+            st.write("#### Deepest Drawdowns")
+            st.dataframe(metrics["episodes"], use_container_width=True)
+
+    def averaging_scenarios(self, holdings, price_col, filters, price_key):
+        from utils import averaging
+        st.markdown("---")
+        st.write("### Scenario Planner")
+        low, high = st.slider("Trigger % range", 1, 50, (5, 30), key="scenario_range")
+        step = st.number_input("Step %", min_value=1, max_value=25, value=5, key="scenario_step")
+        names = st.multiselect("Tier schedules", list(averaging.TIER_SCHEDULES), default=list(averaging.TIER_SCHEDULES))
+        if not names:
+            return
+        thresholds = tuple(range(low, high + 1, int(step)))
+        schedules = {name: averaging.TIER_SCHEDULES[name] for name in names}
+        sim = self.cached(
+            "averaging", filters, price_key, thresholds, tuple(names),
+            compute=lambda: averaging.simulate(holdings, thresholds, schedules, price_col),
+        )
+        st.write("#### Funds Required by Scenario")
+        st.dataframe(sim["scenarios"].pivot(index="threshold_%", columns="schedule", values="funds_required")[names], use_container_width=True)
+        schedule = st.selectbox("Breakdown for schedule", names)
+        for group_by in ["demat", "strategy"]:
+            frame = sim[f"by_{group_by}"]
+            frame = frame[frame["schedule"] == schedule]
+            st.write(f"#### By {group_by.title()}: Funds Required / New Avg Price")
+            st.dataframe(
+                frame.pivot(index="threshold_%", columns=group_by, values=["funds_required", "new_avg_price"]),
+                use_container_width=True,
+            )
+
+    def portfolio_summary(self, holdings, realized_pnl=0.0):
+        # Everything the first three Portfolio tabs show, computed once per cache key
+        agg = PortfolioUtils.summarize_holdings(holdings, group_top_n=3, overall_top_n=5)
+        summary = {"strategy": agg["strategy"], "demat": agg["demat"]}
+        for key in ["winners_strategy", "winners_demat", "winners"]:
+            summary[key] = self.df_to_html(agg[key], 'pnl_pct', 'green')
+        for key in ["losers_strategy", "losers_demat", "losers"]:
+            summary[key] = self.df_to_html(agg[key], 'pnl_pct', 'red')
+        overall_group = agg["overall"]
+        pnl_pct = (overall_group["pnl"] / overall_group["investment"] * 100) if overall_group["investment"] != 0 else 0
+        num_holdings = int(overall_group["count"])
+        avg_holding_size = overall_group["net_qty"] / num_holdings if num_holdings > 0 else 0
+        summary["metrics"] = pd.DataFrame({
+            "Metric": [
+                "Total Invested",
+                "Current Value",
+                "PnL",
+                "PnL %",
+                "Realized PnL",
+                "Number of Holdings",
+                "Avg Holding Size"
+            ],
+            "Value": [
+                f"₹{overall_group['investment']:.2f}",
+                f"₹{overall_group['current_value']:.2f}",
+                f"₹{overall_group['pnl']:.2f}",
+                f"{pnl_pct:.2f}%",
+                f"₹{realized_pnl:.2f}",
+                f"{num_holdings}",
+                f"{avg_holding_size:.2f}"
+            ]
+        })
+        holdings_disp = holdings.reset_index(drop=True)
+        total_value = overall_group["current_value"]
+        holdings_disp["allocation_%"] = (holdings_disp["current_value"] / total_value * 100).round(2) if total_value != 0 else 0
+        summary["holdings"] = holdings_disp
+        return summary
 
     def df_to_html(self, df, color_col, color):
-        if df.empty:
-            return "<i>No data</i>"
-        def get_style(col, val):
-            if col == color_col:
-                return f"color:{color};font-weight:bold;"
-            if col == "allocation_%":
-                return "color:blue;font-weight:bold;" if val > 0 else ""
-            if col == "investment":
-                return "color:orange;font-weight:bold;" if val > 0 else ""
-            if col == "pnl":
-                return "color:green;font-weight:bold;" if val > 0 else "color:red;font-weight:bold;"
-            return ""
-        html = '<table style="width:100%;border-collapse:collapse;">'
-        html += "<tr>" + "".join([f"<th style='border:1px solid #ddd;padding:4px;text-align:left'>{col}</th>" for col in df.columns]) + "</tr>"
-        for _, row in df.iterrows():
-            html += "<tr>"
-            for col in df.columns:
-                val = row[col]
-                style = get_style(col, val)
-                html += f"<td style='border:1px solid #ddd;padding:4px;{style}'>{val}</td>"
-            html += "</tr>"
-        html += "</table>"
-        return html
+        from ui.html_table import render_table
+        with profiling.span("ui.df_to_html", rows=len(df)):
+            return render_table(df, color_col, color)
 
     def cash_ledger(self):
         st.subheader("Cash Balance Management")
@@ -308,21 +270,89 @@ class PortfolioUI:
         if st.button("Add Cash Entry"):
             self.db.insert_cash(datetime.date.today().isoformat(), demat, amount, note)
             st.success("Cash entry added.")
-        st.dataframe(self.db.fetch_cash())
+        demat_options = self.cached("distinct_cash", "demat", compute=lambda: self.db.distinct_values("cash_ledger", "demat"))
+        demat_filter = st.selectbox("Show Demat", ["All"] + demat_options)
+        page = self.browse("cash_ledger", {"demat": None if demat_filter == "All" else demat_filter})
+        st.dataframe(page, use_container_width=True, hide_index=True)
+
+    def transactions(self):
+        st.subheader("Transactions")
+        col1, col2, col3 = st.columns(3)
+        demat_options = self.cached("distinct_tx", "demat", compute=lambda: self.db.distinct_values("transactions", "demat"))
+        strategy_options = self.cached("distinct_tx", "strategy", compute=lambda: self.db.distinct_values("transactions", "strategy"))
+        demats = col1.multiselect("Demat", demat_options, key="tx_demat")
+        strategies = col2.multiselect("Strategy", strategy_options, key="tx_strategy")
+        symbol = col3.text_input("Symbol", key="tx_symbol").strip()
+        filters = {"demat": demats or None, "strategy": strategies or None, "symbol": symbol or None}
+        page = self.browse("transactions", filters)
+        st.dataframe(page, use_container_width=True, hide_index=True)
+
+    def browse(self, table, filters, page_sizes=(50, 100, 250, 1000)):
+        """Sort/page controls for a PortfolioDB.page table; returns the visible page.
+
+        Pages are fetched with keyset cursors. session_state keeps the cursor
+        of every page visited so Previous is a pop rather than an OFFSET scan.
+        """
+        filters = {k: v for k, v in filters.items() if v is not None}
+        sortable = PAGE_TABLES[table][2]
+        col1, col2, col3 = st.columns(3)
+        sort = col1.selectbox("Sort by", sortable, key=f"{table}_sort")
+        descending = col2.selectbox("Order", ["Descending", "Ascending"], key=f"{table}_order") == "Descending"
+        limit = col3.selectbox("Rows per page", page_sizes, key=f"{table}_limit")
+        # Any change to the query starts over from the first page
+        signature = (sort, descending, limit, repr(sorted(filters.items())))
+        state = st.session_state.setdefault(f"{table}_pages", {"signature": None, "cursors": [None]})
+        if state["signature"] != signature:
+            state.update(signature=signature, cursors=[None])
+        cursors = state["cursors"]
+        rows, next_cursor = self.db.page(table, sort, descending, cursors[-1], limit, **filters)
+        total = self.cached("count_rows", table, signature[3], compute=lambda: self.db.count_rows(table, **filters))
+        prev_col, info_col, next_col = st.columns([1, 4, 1])
+        if prev_col.button("◀ Previous", key=f"{table}_prev", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        if next_col.button("Next ▶", key=f"{table}_next", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
+        first = (len(cursors) - 1) * limit
+        info_col.caption(f"Rows {first + 1 if len(rows) else 0:,}–{first + len(rows):,} of {total:,} · page {len(cursors)} of {max(-(-total // limit), 1):,}")
+        return rows
 
     def export(self):
+        from utils.exporter import FORMATS as EXPORT_FORMATS
         st.subheader("Export Transactions and Holdings")
-        tx = self.db.fetch_transactions()
-        if tx.empty:
+        self.db.sync_lots()
+        filters = ((), ())
+        positions = self.cached("positions", filters, compute=lambda: self.db.fetch_positions(open_only=False))
+        if positions.empty and self.db.query_transactions(columns=["id"]).empty:
             st.info("No data available.")
+            return
+        prices = self.prices.get_prices(positions.loc[positions["net_qty"] > 0, "symbol"].unique())
+        price_key = price_signature(prices)
+        fmt = st.radio("Format", list(EXPORT_FORMATS), format_func=str.upper, horizontal=True)
+        generation = self.db.generation()
+        # Files are only built on request, on a background thread, and reused until data or prices change
+        job = self.exports.job(fmt, generation, price_key)
+        if job is None:
+            if st.button("Prepare Export"):
+                holdings = self.cached("holdings", filters, price_key, compute=lambda: PortfolioUtils.holdings_from_positions(positions, prices))
+                job = self.exports.request(fmt, holdings, generation, price_key)
+            else:
+                return
+        if not job.done():
+            st.info("Preparing export in the background...")
+            st.button("Refresh")
+        elif job.exception() is not None:
+            st.error(f"Export failed: {job.exception()}")
+            if st.button("Retry"):
+                holdings = self.cached("holdings", filters, price_key, compute=lambda: PortfolioUtils.holdings_from_positions(positions, prices))
+                self.exports.request(fmt, holdings, generation, price_key)
+                st.rerun()
         else:
-            prices = self.utils.get_mock_prices(tx["symbol"].unique())
-            holdings = self.utils.calculate_holdings(tx, prices)
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-                tx.to_excel(writer, index=False, sheet_name="Transactions")
-                holdings.to_excel(writer, index=False, sheet_name="Holdings")
-            st.download_button("Download Excel", data=output.getvalue(), file_name="portfolio_export.xlsx")
+            file_name, mime = EXPORT_FORMATS[fmt]
+            # Deferred: the file is read only when the user clicks, not on every rerun
+            st.download_button(f"Download {fmt.upper()}", data=functools.partial(read_file, job.result()),
+                               file_name=file_name, mime=mime)
 
     def watchlist(self):
         st.subheader("Watchlist & Social Tagging")
@@ -334,14 +364,17 @@ class PortfolioUI:
             if submitted and symbol:
                 self.db.add_to_watchlist(symbol, tag, note)
                 st.success(f"Added {symbol} to watchlist.")
-        watchlist_df = self.db.fetch_watchlist()
-        if not watchlist_df.empty:
-            st.dataframe(watchlist_df)
-            remove_id = st.number_input("Remove by ID", min_value=1, step=1)
-            if st.button("Remove from Watchlist"):
-                self.db.remove_from_watchlist(remove_id)
-                st.success(f"Removed ID {remove_id} from watchlist.")
-                watchlist_df = self.db.fetch_watchlist()
-                st.dataframe(watchlist_df)
+        tag_filter = st.text_input("Filter by Tag", key="watchlist_tag").strip()
+        page = self.browse("watchlist", {"tag": tag_filter or None})
+        if not page.empty:
+            selection = st.dataframe(page, use_container_width=True, hide_index=True,
+                                     on_select="rerun", selection_mode="multi-row", key="watchlist_table")
+            selected = page.iloc[selection.selection.rows]["id"].tolist()
+            if st.button("Remove Selected from Watchlist", disabled=not selected):
+                for watchlist_id in selected:
+                    self.db.remove_from_watchlist(watchlist_id)
+                st.toast(f"Removed {len(selected)} from watchlist.")
+                # Only the current page is re-read on the rerun
+                st.rerun()
         else:
-            st.info("Watchlist is empty.")
+            st.info("No watchlist entries.")
@@ -0,0 +1,37 @@
+import os
+
+import streamlit as st
+
+# Process-wide objects shared by the page modules. Each is imported and built
+# the first time a page asks for it, so pages that do not need the DB layer,
+# the price provider or the result cache never load them.
+
+PRICE_TTL_SECONDS = 300
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("STOX_RESULT_CACHE_MB", "256")) * 1024 * 1024
+
+@st.cache_resource
+def get_db():
+    from db.portfolio_db import DB_FILE, PortfolioDB
+    return PortfolioDB(DB_FILE)
+
+@st.cache_resource
+def get_price_provider():
+    # One provider per process so its cache and in-flight fetches are shared by all sessions
+    from utils.price_provider import default_provider
+    return default_provider(get_db(), ttl=PRICE_TTL_SECONDS)
+
+@st.cache_resource
+def get_result_cache():
+    # Shared across reruns and sessions; entries are keyed on the DB generation
+    from utils.result_cache import ResultCache
+    return ResultCache(RESULT_CACHE_MAX_BYTES)
+
+@st.cache_resource
+def get_snapshot_store():
+    from utils.snapshots import SnapshotStore
+    return SnapshotStore.for_db(get_db().db_file)
+
+@st.cache_resource
+def get_export_manager():
+    from utils.exporter import ExportManager
+    return ExportManager(get_db())
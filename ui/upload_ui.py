@@ -0,0 +1,77 @@
+import streamlit as st
+import datetime
+import functools
+from utils.portfolio_utils import PortfolioUtils, HOLDINGS_CSV_FIELDS, HOLDINGS_XLSX_FIELDS
+from utils import importer
+from ui.resources import get_db
+
+@st.cache_resource
+def get_ui():
+    return UploadUI()
+
+class UploadUI:
+    @functools.cached_property
+    def db(self):
+        # Only needed once a file is imported
+        return get_db()
+
+    def upload_holdings(self):
+        st.subheader("Upload Initial Holdings File (CSV/XLSX)")
+        file = st.file_uploader("Choose file", type=["csv", "xlsx"], key="holdings")
+        demat = st.text_input("Enter Demat", "Zerodha")
+        strategy = st.text_input("Enter Strategy", "Long Term")
+        if file:
+            try:
+                st.dataframe(importer.preview(file, file.name))
+            except Exception as e:
+                st.error(f"Error reading file: {e}")
+                return
+            fields = HOLDINGS_CSV_FIELDS if file.name.endswith(".csv") else HOLDINGS_XLSX_FIELDS
+            date = datetime.date.today().isoformat()
+            if st.button("Upload as Transactions"):
+                self._run_import(
+                    file,
+                    lambda chunk: PortfolioUtils.normalize_holdings(chunk, fields, demat, strategy, date),
+                    "holdings uploaded as BUY transactions.",
+                )
+
+    def upload_trades(self):
+        st.subheader("Upload Daily Trade Log (CSV/XLSX)")
+        file = st.file_uploader("Choose trade log", type=["csv", "xlsx"])
+        demat = st.text_input("Enter Demat", "Zerodha")
+        strategy = st.text_input("Enter Strategy", "Swing")
+        if file:
+            try:
+                st.dataframe(importer.preview(file, file.name))
+            except Exception as e:
+                st.error(f"Error reading file: {e}")
+                return
+            if st.button("Upload Trades"):
+                self._run_import(
+                    file,
+                    lambda chunk: PortfolioUtils.normalize_trades(chunk, demat, strategy),
+                    "trades uploaded.",
+                )
+
+    def _run_import(self, file, normalize, done_message):
+        # Streams the file in chunks so memory stays flat regardless of file size
+        bar = st.progress(0.0, text="Importing...")
+        def progress(rows_read, fraction):
+            bar.progress(fraction if fraction is not None else 0.0, text=f"Imported {rows_read:,} rows...")
+        try:
+            result = importer.stream_import(self.db, file, file.name, normalize, progress=progress)
+        except Exception as e:
+            bar.empty()
+            st.error(f"Upload failed: {e}")
+            return
+        bar.progress(1.0, text=f"Read {result.rows_read:,} rows.")
+        if result.inserted:
+            st.success(f"{result.inserted} {done_message}")
+        if result.duplicates:
+            st.info(f"{result.duplicates} rows were already uploaded and were skipped.")
+        if result.errors:
+            st.error(f"Some rows failed to upload ({result.error_count}):")
+            for err in result.errors:
+                st.write(err)
+            if result.error_count > len(result.errors):
+                st.write(f"... and {result.error_count - len(result.errors)} more.")
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+# Tier schedules: (minimum CMP drop %, fraction of net_qty to buy), checked
+# from the deepest drop down. DEFAULT_TIERS is the original 3/6/10% ladder.
+DEFAULT_TIERS = ((10, 0.5), (6, 0.4), (3, 0.3))
+TIER_SCHEDULES = {
+    "Default 3/6/10%": DEFAULT_TIERS,
+    "Conservative 5/10/20%": ((20, 0.4), (10, 0.25), (5, 0.1)),
+    "Aggressive 2/5/10/20%": ((20, 1.0), (10, 0.75), (5, 0.5), (2, 0.25)),
+}
+
+
+def _tier_matrix(schedules):
+    # Pad every schedule to the same number of tiers so np.select can run
+    # over all scenarios at once; padding tiers never match (drop >= inf).
+    depth = max(len(tiers) for tiers in schedules)
+    drops = np.full((depth, len(schedules)), np.inf)
+    fracs = np.zeros((depth, len(schedules)))
+    for k, tiers in enumerate(schedules):
+        for j, (drop, frac) in enumerate(sorted(tiers, reverse=True)):
+            drops[j, k] = drop
+            fracs[j, k] = frac
+    return drops, fracs
+
+
+def simulate(holdings, thresholds, schedules=None, price_col="cmp"):
+    """Evaluate every (threshold, tier schedule) scenario over all holdings in one pass.
+
+    thresholds are "CMP below avg price by at least N%" triggers; schedules
+    maps a name to a tier tuple (see TIER_SCHEDULES). Returns a dict of:
+      scenarios   - one row per scenario with candidate count and funds required
+      by_demat    - the same per scenario and demat, plus the resulting avg price
+      by_strategy - the same per scenario and strategy
+      positions   - one row per (scenario, candidate position) with buy_qty,
+                    funds_required, new_qty, new_investment and new_avg_price
+    """
+    schedules = schedules or {"Default 3/6/10%": DEFAULT_TIERS}
+    grid = [(t, name) for t in thresholds for name in schedules]
+    scenario_threshold = np.array([t for t, _ in grid], dtype="float64")
+    drops, fracs = _tier_matrix([schedules[name] for _, name in grid])
+
+    net_qty = holdings["net_qty"].to_numpy(dtype="float64")
+    avg_price = holdings["avg_price"].to_numpy(dtype="float64")
+    cmp = holdings[price_col].to_numpy(dtype="float64")
+    investment = holdings["investment"].to_numpy(dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drop_pct = np.round((avg_price - cmp) / avg_price * 100, 2)
+
+    # holdings x scenarios
+    is_candidate = cmp[:, None] < avg_price[:, None] * (1 - scenario_threshold[None, :] / 100)
+    frac = np.select([drop_pct[:, None] >= drops[j][None, :] for j in range(len(drops))],
+                     [np.broadcast_to(fracs[j], is_candidate.shape) for j in range(len(fracs))], 0.0)
+    buy_qty = np.where(is_candidate, np.round(frac * net_qty[:, None], 0), 0.0)
+    funds = np.round(buy_qty * cmp[:, None], 2)
+    new_qty = net_qty[:, None] + buy_qty
+    new_investment = np.round(investment[:, None] + funds, 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        new_avg = np.where(new_qty > 0, np.round(new_investment / new_qty, 2), avg_price[:, None])
+
+    scenarios = pd.DataFrame({
+        "scenario": np.arange(len(grid)),
+        "threshold_%": scenario_threshold,
+        "schedule": [name for _, name in grid],
+        "candidates": is_candidate.sum(axis=0),
+        "funds_required": funds.sum(axis=0).round(2),
+    })
+    result = {"scenarios": scenarios}
+    for group_by in ["demat", "strategy"]:
+        result[f"by_{group_by}"] = _group_totals(holdings[group_by], scenarios, is_candidate, funds, new_investment, new_qty)
+    rows, cols = np.nonzero(is_candidate)
+    positions = holdings.iloc[rows][["demat", "strategy", "symbol", price_col, "avg_price", "net_qty", "investment"]].reset_index(drop=True)
+    positions.insert(0, "scenario", cols)
+    positions["cmp_drop_%"] = drop_pct[rows]
+    positions["buy_qty"] = buy_qty[rows, cols]
+    positions["funds_required"] = funds[rows, cols]
+    positions["new_qty"] = new_qty[rows, cols]
+    positions["new_investment"] = new_investment[rows, cols]
+    positions["new_avg_price"] = new_avg[rows, cols]
+    result["positions"] = positions
+    return result
+
+
+def _group_totals(keys, scenarios, is_candidate, funds, new_investment, new_qty):
+    # Sum each holdings x scenarios matrix into groups x scenarios with one bincount
+    codes, labels = pd.factorize(keys, sort=True)
+    n_groups, n_scenarios = len(labels), is_candidate.shape[1]
+    flat = (codes[:, None] * n_scenarios + np.arange(n_scenarios)[None, :]).ravel()
+
+    def total(matrix):
+        return np.bincount(flat, weights=matrix.ravel(), minlength=n_groups * n_scenarios).reshape(n_groups, n_scenarios)
+
+    count = total(is_candidate.astype("float64"))
+    funds_total = total(funds)
+    # Avg price across the group's candidate positions after averaging
+    cand_investment = total(np.where(is_candidate, new_investment, 0.0))
+    cand_qty = total(np.where(is_candidate, new_qty, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        new_avg = np.where(cand_qty > 0, np.round(cand_investment / cand_qty, 2), np.nan)
+    out = pd.DataFrame({
+        "scenario": np.tile(scenarios["scenario"].to_numpy(), n_groups),
+        "threshold_%": np.tile(scenarios["threshold_%"].to_numpy(), n_groups),
+        "schedule": np.tile(scenarios["schedule"].to_numpy(), n_groups),
+        keys.name: np.repeat(np.asarray(labels, dtype=object), n_scenarios),
+        "candidates": count.ravel().astype("int64"),
+        "funds_required": funds_total.ravel().round(2),
+        "new_avg_price": new_avg.ravel(),
+    })
+    return out.sort_values(["scenario", keys.name], kind="stable").reset_index(drop=True)
+
+
+def candidates(holdings, threshold, tiers=DEFAULT_TIERS, price_col="cmp"):
+    """Single-scenario view: the candidate holdings with their averaging columns."""
+    sim = simulate(holdings, [threshold], {"tiers": tiers}, price_col)
+    return sim["positions"].drop(columns="scenario")
@@ -0,0 +1,159 @@
+import csv
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+EXPORT_CHUNK_ROWS = 50_000
+EXCEL_MAX_ROWS = 1_048_576
+# Finished artifacts kept per format. A page rendered before newer exports
+# finished still links to its own file until this many newer ones exist.
+KEEP_ARTIFACTS = 4
+# Files in the export directory that no job of this process tracks (left by
+# an earlier run) are removed once they are this old
+ORPHAN_MAX_AGE_SECONDS = 24 * 3600
+FORMATS = {
+    "xlsx": ("portfolio_export.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("portfolio_export_csv.zip", "application/zip"),
+    "parquet": ("portfolio_export_parquet.zip", "application/zip"),
+}
+
+
+class ExportManager:
+    """Builds export files on a background thread and keeps the finished ones on disk.
+
+    Transactions are streamed from SQLite in chunks, so neither the full
+    transaction frame nor the finished file is held in memory. Artifacts are
+    keyed on (format, DB generation, price key); a request for a key that is
+    already built or building returns the same future.
+
+    Files live in <db name>_exports next to the database (or STOX_EXPORT_DIR),
+    and the oldest are pruned as newer exports finish.
+    """
+
+    def __init__(self, db, export_dir=None, chunk_rows=EXPORT_CHUNK_ROWS):
+        self.db = db
+        self.export_dir = (export_dir or os.environ.get("STOX_EXPORT_DIR")
+                           or os.path.splitext(os.path.abspath(db.db_file))[0] + "_exports")
+        os.makedirs(self.export_dir, exist_ok=True)
+        self.chunk_rows = chunk_rows
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+        self._jobs = {}  # (fmt, generation, price_key) -> Future[path], oldest request first
+        self._lock = threading.Lock()
+        self._prune_orphans()
+
+    def job(self, fmt, generation, price_key):
+        """The existing job for this key, or None if it was never requested or its file is gone."""
+        key = (fmt, generation, price_key)
+        with self._lock:
+            future = self._jobs.get(key)
+            if future is not None and future.done() and future.exception() is None and not os.path.exists(future.result()):
+                del self._jobs[key]
+                return None
+            return future
+
+    def request(self, fmt, holdings, generation, price_key):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        key = (fmt, generation, price_key)
+        with self._lock:
+            future = self._jobs.get(key)
+            if future is None or (future.done() and future.exception() is not None):
+                future = self._executor.submit(self._build, key, holdings)
+                self._jobs[key] = future
+            return future
+
+    def _build(self, key, holdings):
+        fmt, generation, _ = key
+        path = os.path.join(self.export_dir, f"export-{fmt}-{generation}-{abs(hash(key))}{os.path.splitext(FORMATS[fmt][0])[1]}")
+        tmp = path + ".part"
+        try:
+            getattr(self, f"_write_{fmt}")(tmp, holdings)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self._prune(fmt, keep=path)
+        return path
+
+    def _prune(self, fmt, keep):
+        # Drops the oldest finished artifacts of this format beyond KEEP_ARTIFACTS
+        with self._lock:
+            finished = [k for k, f in self._jobs.items()
+                        if k[0] == fmt and f.done() and f.exception() is None and f.result() != keep]
+            stale = finished[:max(len(finished) - (KEEP_ARTIFACTS - 1), 0)]
+            paths = [self._jobs.pop(k).result() for k in stale]
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _prune_orphans(self):
+        cutoff = time.time() - ORPHAN_MAX_AGE_SECONDS
+        for entry in os.scandir(self.export_dir):
+            if entry.name.startswith("export-") and entry.is_file() and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass  # removed by another process sharing the directory
+
+    def _chunks(self):
+        return self.db.iter_transactions(self.chunk_rows)
+
+    def _write_xlsx(self, path, holdings):
+        import xlsxwriter
+        # constant_memory flushes each row to disk once the next row starts
+        workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "nan_inf_to_errors": True})
+        try:
+            sheet, row, part = None, 0, 0
+            for chunk in self._chunks():
+                for values in chunk.itertuples(index=False, name=None):
+                    if sheet is None or row >= EXCEL_MAX_ROWS:
+                        part += 1
+                        sheet = workbook.add_worksheet("Transactions" if part == 1 else f"Transactions {part}")
+                        sheet.write_row(0, 0, list(chunk.columns))
+                        row = 1
+                    sheet.write_row(row, 0, values)
+                    row += 1
+            sheet = workbook.add_worksheet("Holdings")
+            sheet.write_row(0, 0, list(holdings.columns))
+            for row, values in enumerate(holdings.itertuples(index=False, name=None), start=1):
+                sheet.write_row(row, 0, values)
+        finally:
+            workbook.close()
+
+    def _write_csv(self, path, holdings):
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            with zf.open("transactions.csv", "w", force_zip64=True) as raw:
+                header = True
+                for chunk in self._chunks():
+                    raw.write(chunk.to_csv(index=False, header=header, quoting=csv.QUOTE_MINIMAL).encode())
+                    header = False
+            zf.writestr("holdings.csv", holdings.to_csv(index=False))
+
+    def _write_parquet(self, path, holdings):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)") from e
+        tx_path, holdings_path = path + ".transactions", path + ".holdings"
+        try:
+            writer = None
+            for chunk in self._chunks():
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tx_path, table.schema)
+                writer.write_table(table.cast(writer.schema))
+            if writer is not None:
+                writer.close()
+            pq.write_table(pa.Table.from_pandas(holdings, preserve_index=False), holdings_path)
+            # Parquet is already compressed, so store rather than deflate
+            with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as zf:
+                if writer is not None:
+                    zf.write(tx_path, "transactions.parquet")
+                zf.write(holdings_path, "holdings.parquet")
+        finally:
+            for p in (tx_path, holdings_path):
+                if os.path.exists(p):
+                    os.remove(p)
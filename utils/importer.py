@@ -0,0 +1,137 @@
+import os
+from collections import namedtuple
+
+import pandas as pd
+
+from utils.profiling import span, timed
+
+CHUNK_ROWS = 50_000
+MAX_REPORTED_ERRORS = 1000
+
+ImportResult = namedtuple("ImportResult", ["rows_read", "inserted", "duplicates", "error_count", "errors"])
+ParsedFile = namedtuple("ParsedFile", ["rows_read", "chunks", "error_count", "errors"])
+
+
+def _file_size(file):
+    try:
+        pos = file.tell()
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        file.seek(pos)
+        return size
+    except (AttributeError, OSError):
+        return None
+
+
+def _iter_csv(file, chunksize):
+    # read_csv keeps a running RangeIndex across chunks, so row numbers stay file-wide
+    size = _file_size(file)
+    for chunk in pd.read_csv(file, chunksize=chunksize):
+        fraction = None
+        if size:
+            try:
+                fraction = min(file.tell() / size, 1.0)
+            except (AttributeError, OSError):
+                pass
+        yield chunk, fraction
+
+
+def _iter_xlsx(file, chunksize, max_rows=None):
+    from openpyxl import load_workbook
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [c if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+        total = (ws.max_row - 1) if ws.max_row else None
+        batch, start = [], 0
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            batch.append(row[:len(columns)])
+            if len(batch) >= chunksize or (max_rows and start + len(batch) >= max_rows):
+                yield pd.DataFrame(batch, columns=columns, index=range(start, start + len(batch))), \
+                    (min((start + len(batch)) / total, 1.0) if total else None)
+                start += len(batch)
+                batch = []
+                if max_rows and start >= max_rows:
+                    return
+        if batch:
+            yield pd.DataFrame(batch, columns=columns, index=range(start, start + len(batch))), 1.0
+    finally:
+        wb.close()
+
+
+def iter_chunks(file, name, chunksize=CHUNK_ROWS):
+    """Yield (DataFrame, fraction_done) chunks of a CSV or XLSX file without loading it whole.
+
+    fraction_done is None when the total size is unknown.
+    """
+    if name.lower().endswith(".csv"):
+        return _iter_csv(file, chunksize)
+    return _iter_xlsx(file, chunksize)
+
+
+def preview(file, name, rows=5):
+    """First few rows of the file, leaving the file positioned at the start."""
+    if name.lower().endswith(".csv"):
+        df = pd.read_csv(file, nrows=rows)
+    else:
+        df = next((chunk for chunk, _ in _iter_xlsx(file, rows, max_rows=rows)), pd.DataFrame())
+    file.seek(0)
+    return df
+
+
+@timed("import.stream_import")
+def stream_import(db, file, name, normalize, chunksize=CHUNK_ROWS, progress=None):
+    """Map, validate and bulk-insert a file chunk by chunk.
+
+    normalize(chunk) -> (transactions, errors), e.g. a partial of
+    PortfolioUtils.normalize_trades. progress(rows_read, fraction_done) is
+    called after each chunk. Peak memory is bounded by chunksize.
+    """
+    rows_read = inserted = duplicates = error_count = 0
+    errors = []
+    chunks = iter_chunks(file, name, chunksize)
+    while True:
+        with span("import.read_chunk") as info:
+            item = next(chunks, None)
+            info["rows"] = len(item[0]) if item is not None else 0
+        if item is None:
+            break
+        chunk, fraction = item
+        with span("import.normalize", rows=len(chunk)):
+            tx, chunk_errors = normalize(chunk)
+        if not tx.empty:
+            result = db.insert_transactions_bulk(tx)
+            inserted += result.inserted
+            duplicates += result.duplicates
+        rows_read += len(chunk)
+        error_count += len(chunk_errors)
+        errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(errors)])
+        if progress:
+            progress(rows_read, fraction)
+    return ImportResult(rows_read, inserted, duplicates, error_count, errors)
+
+
+def parse_file(path, normalize, chunksize=CHUNK_ROWS):
+    """Read and normalize a file on disk without touching the database.
+
+    Used by the CLI's worker processes, so normalize must be picklable (e.g.
+    a functools.partial of a PortfolioUtils normalizer). The normalized
+    chunks keep the file's row numbers as their index.
+    """
+    rows_read = error_count = 0
+    chunks, errors = [], []
+    with open(path, "rb") as file:
+        for chunk, _ in iter_chunks(file, os.path.basename(path), chunksize):
+            tx, chunk_errors = normalize(chunk)
+            if not tx.empty:
+                chunks.append(tx)
+            rows_read += len(chunk)
+            error_count += len(chunk_errors)
+            errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(errors)])
+    return ParsedFile(rows_read, chunks, error_count, errors)
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+KEYS = ["demat", "strategy", "symbol"]
+
+
+class LotBook:
+    """FIFO queue of open lots for one (demat, strategy, symbol).
+
+    Lots live in parallel lists with a moving head index, so closing lots
+    never shifts the list; the consumed prefix is dropped once it dominates.
+    Long lots have positive qty, short lots negative.
+    """
+
+    __slots__ = ("qty", "price", "date", "head", "realized", "last_date")
+
+    def __init__(self):
+        self.qty = []
+        self.price = []
+        self.date = []
+        self.head = 0
+        self.realized = 0.0
+        self.last_date = None
+
+    def add(self, date, qty, price):
+        self.last_date = date
+        qty_lots = self.qty
+        h = self.head
+        # Nothing to close against: just open a new lot
+        if h == len(qty_lots) or (qty_lots[h] > 0) == (qty > 0):
+            qty_lots.append(qty)
+            self.price.append(price)
+            self.date.append(date)
+            return
+        price_lots = self.price
+        remaining = qty
+        while remaining and h < len(qty_lots):
+            lot = qty_lots[h]
+            take = min(abs(lot), abs(remaining))
+            if lot > 0:
+                self.realized += take * (price - price_lots[h])
+                remaining += take
+                lot -= take
+            else:
+                self.realized += take * (price_lots[h] - price)
+                remaining -= take
+                lot += take
+            if lot:
+                qty_lots[h] = lot
+            else:
+                h += 1
+        if remaining:
+            qty_lots.append(remaining)
+            price_lots.append(price)
+            self.date.append(date)
+        if h > 32 and h * 2 > len(qty_lots):
+            del qty_lots[:h], price_lots[:h], self.date[:h]
+            h = 0
+        self.head = h
+
+    def open_lots(self):
+        h = self.head
+        return self.date[h:], self.qty[h:], self.price[h:]
+
+    def open_qty(self):
+        return sum(self.qty[self.head:])
+
+    def open_cost(self):
+        h = self.head
+        return sum(q * p for q, p in zip(self.qty[h:], self.price[h:]))
+
+
+class LotEngine:
+    """FIFO lot matching over trades, grouped by (demat, strategy, symbol).
+
+    Trades are processed in (date, id) order within each key; every trade is
+    touched once and every lot is opened and closed at most once, so a run
+    is linear in the number of trades. An engine can be seeded with the open
+    lots and realized P&L of an earlier run (see from_state) and fed only
+    the trades added since.
+    """
+
+    def __init__(self):
+        self.books = {}
+
+    @classmethod
+    def from_state(cls, lots, realized=None):
+        """lots: frame of demat/strategy/symbol/date/qty/price in FIFO order (seq).
+        realized: optional {key: realized_pnl}."""
+        engine = cls()
+        for key, date, qty, price in zip(
+            zip(*(lots[k].tolist() for k in KEYS)),
+            lots["date"].tolist(), lots["qty"].tolist(), lots["price"].tolist(),
+        ):
+            book = engine.books.get(key)
+            if book is None:
+                book = engine.books[key] = LotBook()
+            book.qty.append(qty)
+            book.price.append(price)
+            book.date.append(date)
+            book.last_date = date
+        for key, value in (realized or {}).items():
+            book = engine.books.get(key)
+            if book is None:
+                book = engine.books[key] = LotBook()
+            book.realized = value
+        return engine
+
+    def process(self, trades):
+        """Apply trades (demat, strategy, symbol, date, qty, price, side[, id])."""
+        if trades.empty:
+            return
+        trades = trades.dropna(subset=KEYS)
+        if trades.empty:
+            return
+        codes = trades.groupby(KEYS, sort=False, observed=True).ngroup().to_numpy()
+        dates = trades["date"].astype(str).to_numpy()
+        tiebreak = trades["id"].to_numpy() if "id" in trades.columns else np.arange(len(trades))
+        order = np.lexsort((tiebreak, dates, codes))
+        codes = codes[order]
+        is_buy = (trades["side"].astype(str).str.upper() == "BUY").to_numpy()[order]
+        qty = trades["qty"].to_numpy(dtype="int64")[order]
+        signed = np.where(is_buy, qty, -qty).tolist()
+        prices = trades["price"].to_numpy(dtype="float64")[order].tolist()
+        dates = dates[order].tolist()
+        # Walk each key's run of trades with its book bound once
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        ends = np.r_[starts[1:], len(codes)].tolist()
+        first = trades[KEYS].iloc[order[starts]]
+        keys = zip(*(first[c].tolist() for c in KEYS))
+        books = self.books
+        for key, start, end in zip(keys, starts.tolist(), ends):
+            book = books.get(key)
+            if book is None:
+                book = books[key] = LotBook()
+            add = book.add
+            for date, q, price in zip(dates[start:end], signed[start:end], prices[start:end]):
+                if q:
+                    add(date, q, price)
+
+    def open_lots(self):
+        """One row per open lot, with seq giving FIFO order within the key."""
+        rows = {c: [] for c in KEYS + ["seq", "date", "qty", "price"]}
+        for (demat, strategy, symbol), book in self.books.items():
+            dates, qtys, prices = book.open_lots()
+            n = len(qtys)
+            rows["demat"].extend([demat] * n)
+            rows["strategy"].extend([strategy] * n)
+            rows["symbol"].extend([symbol] * n)
+            rows["seq"].extend(range(n))
+            rows["date"].extend(dates)
+            rows["qty"].extend(qtys)
+            rows["price"].extend(prices)
+        return pd.DataFrame(rows)
+
+    def positions(self):
+        """Per key: net_qty, open_cost (FIFO cost of open lots), realized_pnl and last_date."""
+        rows = [
+            (*key, book.open_qty(), book.open_cost(), book.realized, book.last_date)
+            for key, book in self.books.items()
+        ]
+        df = pd.DataFrame(rows, columns=KEYS + ["net_qty", "open_cost", "realized_pnl", "last_date"])
+        return df.sort_values(KEYS).reset_index(drop=True)
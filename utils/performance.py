@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+DAYS_PER_YEAR = 365.0
+
+
+def growth_index(nav, flow):
+    """Time-weighted growth of 1 unit, chaining daily returns net of flows.
+
+    Flows are taken to arrive at the start of the day they are booked:
+    r_t = NAV_t / (NAV_{t-1} + flow_t) - 1. Days whose starting capital is
+    not positive contribute no return.
+    """
+    nav = np.asarray(nav, dtype="float64")
+    flow = np.asarray(flow, dtype="float64")
+    if len(nav) == 0:
+        return nav
+    base = np.r_[np.nan, nav[:-1] + flow[1:]]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(base > 0, nav / base, 1.0)
+    ratio[0] = 1.0
+    return np.cumprod(ratio)
+
+
+def twr(dates, growth):
+    """(total, annualized) time-weighted return; annualized is None below one year."""
+    if len(growth) < 2:
+        return 0.0, None
+    total = growth[-1] - 1.0
+    years = (pd.Timestamp(dates[-1]) - pd.Timestamp(dates[0])).days / DAYS_PER_YEAR
+    return total, (growth[-1] ** (1 / years) - 1.0 if years >= 1 else None)
+
+
+def xirr(dates, amounts, guess=0.1, tol=1e-10, max_iter=100):
+    """Annual rate at which the dated amounts (investor's view: deposits negative) have zero NPV.
+
+    Newton's method from guess, falling back to bisection; None if the
+    amounts do not change sign.
+    """
+    amounts = np.asarray(amounts, dtype="float64")
+    if not (amounts > 0).any() or not (amounts < 0).any():
+        return None
+    days = pd.to_datetime(pd.Series(dates)).to_numpy().astype("datetime64[D]").astype("int64")
+    years = (days - days[0]) / DAYS_PER_YEAR
+
+    def npv(rate):
+        return (amounts * (1.0 + rate) ** -years).sum()
+
+    rate = guess
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        for _ in range(max_iter):
+            factor = (1.0 + rate) ** -years
+            value = (amounts * factor).sum()
+            slope = (-years * amounts * factor / (1.0 + rate)).sum()
+            if not np.isfinite(value) or slope == 0:
+                break
+            step = value / slope
+            rate -= step
+            if rate <= -1:
+                break
+            if abs(step) < tol:
+                return float(rate)
+        lo, hi = -0.9999, 1.0
+        while npv(hi) > 0 and hi < 1e6:
+            hi *= 10
+        if np.sign(npv(lo)) == np.sign(npv(hi)):
+            return None
+        for _ in range(200):
+            mid = (lo + hi) / 2
+            if np.sign(npv(mid)) == np.sign(npv(lo)):
+                lo = mid
+            else:
+                hi = mid
+            if hi - lo < tol:
+                break
+    return float((lo + hi) / 2)
+
+
+def portfolio_xirr(dates, nav, flow):
+    """XIRR treating the first NAV and every later flow as deposits and the last NAV as the payout."""
+    if len(nav) < 2:
+        return None
+    amounts = -np.asarray(flow, dtype="float64").copy()
+    amounts[0] = -nav[0]
+    amounts[-1] += nav[-1]
+    return xirr(dates, amounts)
+
+
+def drawdown(growth):
+    """Fractional decline of the growth index from its running peak (0 at new highs)."""
+    growth = np.asarray(growth, dtype="float64")
+    if len(growth) == 0:
+        return growth
+    return growth / np.maximum.accumulate(growth) - 1.0
+
+
+def drawdown_episodes(dates, growth, top=5):
+    """The deepest peak-to-recovery episodes, deepest first."""
+    dd = drawdown(growth)
+    columns = ["peak", "trough", "recovery", "depth_%", "days_to_trough", "days_underwater"]
+    underwater = dd < 0
+    if not underwater.any():
+        return pd.DataFrame(columns=columns)
+    # Runs of consecutive underwater days; each starts the day after a peak
+    edges = np.diff(np.r_[0, underwater.astype("int8"), 0])
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    run = np.repeat(np.arange(len(starts)), ends - starts)
+    days = np.flatnonzero(underwater)
+    # First day of each run in (run, dd) order is that run's trough
+    order = np.lexsort((dd[days], run))
+    troughs = days[order[np.r_[0, np.cumsum(ends - starts)[:-1]]]]
+    deepest = np.argsort(dd[troughs], kind="stable")[:top]
+    dates = pd.DatetimeIndex(pd.to_datetime(pd.Series(dates)))
+    starts, ends, troughs = starts[deepest], ends[deepest], troughs[deepest]
+    peaks = np.maximum(starts - 1, 0)
+    recovered = ends < len(dd)
+    recovery = dates[np.minimum(ends, len(dd) - 1)]
+    return pd.DataFrame({
+        "peak": dates[peaks],
+        "trough": dates[troughs],
+        "recovery": recovery.where(recovered, pd.NaT),
+        "depth_%": np.round(dd[troughs] * 100, 2),
+        "days_to_trough": (dates[troughs] - dates[peaks]).days,
+        "days_underwater": (recovery - dates[peaks]).days,
+    }, columns=columns)
+
+
+def summarize(history):
+    """Metrics and daily series for a nav_series frame (date, nav, flow)."""
+    dates, nav, flow = history["date"].to_numpy(), history["nav"].to_numpy(), history["flow"].to_numpy()
+    growth = growth_index(nav, flow)
+    dd = drawdown(growth)
+    total, annualized = twr(dates, growth)
+    series = pd.DataFrame({"nav": nav, "growth": growth, "drawdown_%": dd * 100}, index=pd.DatetimeIndex(dates, name="date"))
+    return {
+        "twr": total,
+        "twr_annualized": annualized,
+        "xirr": portfolio_xirr(dates, nav, flow),
+        "max_drawdown": float(dd.min()) if len(dd) else 0.0,
+        "current_drawdown": float(dd[-1]) if len(dd) else 0.0,
+        "series": series,
+        "episodes": drawdown_episodes(dates, growth),
+    }
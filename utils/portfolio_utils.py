@@ -1,28 +1,247 @@
+import datetime
+import numpy as np
 import pandas as pd
+from utils.lots import LotEngine
+from utils.profiling import timed
+
+# Column aliases seen in broker exports, in order of preference
+HOLDINGS_CSV_FIELDS = {
+    "symbol": ["Instrument", "Name", "symbol", "Symbol"],
+    "qty": ["Qty.", "Qty", "quantity"],
+    "price": ["Avg. cost", "Avg.", "ATP", "avg_price", "Price"],
+}
+# Excel fields: Name, Exchange, Status, Action, Qty, ATP, LTP, LTP %, Gain/loss, Gain/loss %
+# Also support: Client ID, Company Name, ISIN, MarketCap, Sector, Total Quantity, Avg Trading Price, LTP, Invested Value, Market Value, Overall Gain/Loss
+HOLDINGS_XLSX_FIELDS = {
+    "symbol": ["Company Name", "Name", "Instrument", "symbol", "Symbol"],
+    "qty": ["Total Quantity", "Qty", "Qty.", "quantity"],
+    "price": ["Avg Trading Price", "ATP", "Avg.", "Avg. cost", "Price", "avg_price"],
+}
+TRADE_FIELDS = {
+    "symbol": ["Symbol", "symbol"],
+    "qty": ["Qty", "quantity"],
+    "price": ["Price", "price"],
+    "side": ["Side", "side"],
+    "date": ["Date"],
+}
+TRANSACTION_COLUMNS = ["date", "demat", "symbol", "qty", "price", "side", "strategy"]
 
 class PortfolioUtils:
     @staticmethod
+    @timed("utils.calculate_holdings")
     def calculate_holdings(transactions, price_lookup):
         if transactions.empty:
             return pd.DataFrame()
-        transactions["signed_qty"] = transactions.apply(
-            lambda x: x["qty"] if x["side"].upper() == "BUY" else -x["qty"], axis=1
+        keys = ["demat", "strategy", "symbol"]
+        qty = transactions["qty"].to_numpy(dtype="float64")
+        price = transactions["price"].to_numpy(dtype="float64")
+        side = transactions["side"]
+        if isinstance(side.dtype, pd.CategoricalDtype):
+            # Compare the few categories, not every row
+            is_buy = np.r_[side.cat.categories.astype(str).str.upper() == "BUY", False][side.cat.codes.to_numpy()]
+        else:
+            is_buy = (side.astype(str).str.upper() == "BUY").to_numpy()
+        # Work on a narrow frame so the caller's transactions are left untouched
+        frame = transactions[keys].copy()
+        frame["signed_qty"] = np.where(is_buy, qty, -qty)
+        frame["qty"] = qty
+        frame["cost"] = qty * price
+        # observed=True: only key combinations that occur, not the cross
+        # product of the categoricals' categories (pandas < 3 default)
+        grouped = frame.groupby(keys, as_index=False, sort=True, observed=True).agg(
+            net_qty=("signed_qty", "sum"),
+            total_qty=("qty", "sum"),
+            total_cost=("cost", "sum"),
+        )
+        # Categorical keys (PortfolioDB.query_transactions) go back to plain strings
+        grouped = grouped.astype({k: str for k in keys if isinstance(grouped[k].dtype, pd.CategoricalDtype)})
+        return PortfolioUtils._value_positions(grouped, price_lookup)
+
+    @staticmethod
+    @timed("utils.holdings_from_positions")
+    def holdings_from_positions(positions, price_lookup):
+        """Same output as calculate_holdings, from PortfolioDB.fetch_positions rows."""
+        if positions.empty:
+            return pd.DataFrame()
+        numeric = ["net_qty", "total_qty", "total_cost", "open_cost", "realized_pnl"]
+        grouped = positions.astype({c: "float64" for c in numeric if c in positions.columns})
+        if "open_cost" in grouped.columns:
+            # FIFO cost basis of the lots still open (see PortfolioDB.sync_lots)
+            grouped = grouped.drop(columns=["total_qty", "total_cost", "last_date"], errors="ignore")
+            grouped = grouped.rename(columns={"open_cost": "total_cost"})
+            grouped["total_qty"] = grouped["net_qty"]
+        return PortfolioUtils._value_positions(grouped, price_lookup)
+
+    @staticmethod
+    @timed("utils.calculate_fifo_holdings")
+    def calculate_fifo_holdings(transactions, price_lookup):
+        """calculate_holdings with FIFO cost basis and a realized_pnl column, from a full replay."""
+        if transactions.empty:
+            return pd.DataFrame()
+        engine = LotEngine()
+        engine.process(transactions)
+        return PortfolioUtils.holdings_from_positions(engine.positions(), price_lookup)
+
+    @staticmethod
+    def _value_positions(grouped, price_lookup):
+        total_qty = grouped["total_qty"].to_numpy()
+        grouped["avg_price"] = np.divide(
+            grouped["total_cost"].to_numpy(), total_qty,
+            out=np.zeros(len(grouped)), where=total_qty > 0,
         )
-        grouped = transactions.groupby(["demat", "strategy", "symbol"], as_index=False).apply(
-            lambda g: pd.Series({
-                "net_qty": g["signed_qty"].sum(),
-                "avg_price": ((g["qty"] * g["price"]).sum() / g["qty"].sum()) if g["qty"].sum() > 0 else 0
-            })
-        ).reset_index()
+        grouped = grouped.drop(columns=["total_qty", "total_cost"])
         grouped = grouped[grouped["net_qty"] > 0]
         grouped["cmp"] = grouped["symbol"].map(price_lookup).fillna(0)
         grouped["investment"] = grouped["net_qty"] * grouped["avg_price"]
         grouped["current_value"] = grouped["net_qty"] * grouped["cmp"]
         grouped["pnl"] = grouped["current_value"] - grouped["investment"]
         grouped["pnl_pct"] = (grouped["pnl"] / grouped["investment"] * 100).round(2)
+        if "realized_pnl" in grouped.columns:
+            grouped = grouped[[c for c in grouped.columns if c != "realized_pnl"] + ["realized_pnl"]]
         return grouped
 
+    @staticmethod
+    @timed("utils.summarize_holdings")
+    def summarize_holdings(holdings, group_top_n=3, overall_top_n=5):
+        """All Portfolio tab summaries from one grouped pass and one sort.
+
+        Returns a dict with "strategy"/"demat" aggregate frames, "overall"
+        totals, and winners/losers frames ("winners_strategy", "losers_demat",
+        "winners", ...) in the layout of PortfolioUI.get_top_performers.
+        """
+        summary = {}
+        # One groupby at the finest level; the per-strategy, per-demat and
+        # overall figures are roll-ups of this small frame.
+        partial = holdings.groupby(["strategy", "demat"], as_index=False, sort=False).agg(
+            pnl=("pnl", "sum"),
+            pnl_pct_sum=("pnl_pct", "sum"),
+            pnl_pct_count=("pnl_pct", "count"),
+            current_value=("current_value", "sum"),
+            net_qty=("net_qty", "sum"),
+            investment=("investment", "sum"),
+        )
+        for group_by in ["strategy", "demat"]:
+            group = partial.groupby(group_by, as_index=False).sum(numeric_only=True)
+            group["pnl_pct"] = group["pnl_pct_sum"] / group["pnl_pct_count"].where(group["pnl_pct_count"] > 0)
+            group = group[[group_by, "pnl", "pnl_pct", "current_value", "net_qty"]]
+            total_value = group["current_value"].sum()
+            group["allocation_%"] = (group["current_value"] / total_value * 100).round(2) if total_value != 0 else 0
+            summary[group_by] = group
+        summary["overall"] = partial[["investment", "current_value", "pnl", "net_qty"]].sum()
+        summary["overall"]["count"] = len(holdings)
+
+        ranked = holdings[holdings["pnl_pct"].notna()].sort_values("pnl_pct", ascending=False, kind="stable")
+        reverse = ranked.iloc[::-1]
+        for group_by in ["strategy", "demat"]:
+            summary[f"winners_{group_by}"] = PortfolioUtils._performers(ranked.groupby(group_by, sort=False).head(group_top_n), group_by)
+            summary[f"losers_{group_by}"] = PortfolioUtils._performers(reverse.groupby(group_by, sort=False).head(group_top_n), group_by)
+        summary["winners"] = PortfolioUtils._performers(ranked.head(overall_top_n), None)
+        summary["losers"] = PortfolioUtils._performers(reverse.head(overall_top_n), None)
+        return summary
+
+    @staticmethod
+    def _performers(df, group_by):
+        total_value = df["current_value"].sum()
+        allocation = (df["current_value"] / total_value * 100).round(2) if total_value != 0 else 0
+        if group_by:
+            out = df[["symbol", group_by, "pnl_pct"]].copy()
+        else:
+            out = df[["symbol", "strategy", "demat", "pnl_pct"]].copy()
+        out["allocation_%"] = allocation
+        out["investment"] = df["investment"]
+        return out.reset_index(drop=True)
+
     @staticmethod
     def get_mock_prices(symbols):
-        import random
-        return {s: random.uniform(100, 2000) for s in symbols}
+        # Kept for callers that want a quick lookup; prices are stable per symbol now
+        from utils.price_provider import MockPriceProvider
+        return MockPriceProvider().get_prices(symbols)
+
+
+    @staticmethod
+    def first_present(df, fields):
+        # Column-wise equivalent of picking the first alias with a value on each row
+        out = pd.Series(None, index=df.index, dtype=object)
+        for f in fields:
+            if f in df.columns:
+                col = df[f]
+                if col.dtype == object or pd.api.types.is_string_dtype(col):
+                    col = col.where(col.astype(str).str.strip() != "")
+                out = out.where(out.notna(), col)
+        return out
+
+    @staticmethod
+    def parse_dates(values):
+        """Dates as ISO YYYY-MM-DD strings, so stored dates sort chronologically.
+
+        ISO input (with or without a time) is taken as is; anything else is
+        read day-first, as Indian broker exports write it (15-12-2023).
+        Unparseable values become NaN.
+        """
+        text = values.astype(str).str.strip()
+        parsed = pd.to_datetime(text, format="ISO8601", errors="coerce")
+        rest = parsed.isna() & values.notna()
+        if rest.any():
+            parsed[rest] = pd.to_datetime(text[rest], format="mixed", dayfirst=True, errors="coerce")
+        return parsed.dt.strftime("%Y-%m-%d").astype(object).where(parsed.notna(), None)
+
+    @staticmethod
+    def _to_transactions(df, symbol, qty_val, price_val, side, date, demat, strategy, dated=False):
+        # Zerodha positions sometimes report qty like '12 Shares'
+        shares = qty_val.astype(str).str.extract(r"^\s*(\d+)\s+Share", expand=False)
+        qty_val = shares.where(shares.notna(), qty_val)
+        qty = pd.to_numeric(qty_val, errors="coerce")
+        price = pd.to_numeric(price_val, errors="coerce")
+        missing = symbol.isna() | qty_val.isna() | price_val.isna()
+        invalid = ~missing & (qty.isna() | price.isna())
+        reason = pd.Series(None, index=df.index, dtype=object)
+        if isinstance(date, pd.Series):
+            date = PortfolioUtils.parse_dates(date)
+            bad_date = ~missing & ~invalid & date.isna()
+            reason[bad_date] = "Invalid date."
+            invalid |= bad_date
+        reason[invalid & reason.isna()] = "Invalid quantity or price."
+        reason[missing] = "Missing required fields."
+        errors = [f"Row {idx}: {msg}" for idx, msg in reason.dropna().items()]
+        ok = ~(missing | invalid)
+        out = pd.DataFrame({
+            "date": date[ok] if isinstance(date, pd.Series) else date,
+            "demat": demat,
+            "symbol": symbol[ok].astype(str),
+            "qty": qty[ok].astype("int64"),
+            "price": price[ok].astype("float64"),
+            "side": side[ok] if isinstance(side, pd.Series) else side,
+            "strategy": strategy,
+            # False where the date was filled in (today) rather than read from the file
+            "date_from_file": dated[ok] if isinstance(dated, pd.Series) else dated,
+        }, index=df.index[ok])
+        return out[TRANSACTION_COLUMNS + ["date_from_file"]], errors
+
+    @staticmethod
+    @timed("utils.normalize_holdings")
+    def normalize_holdings(df, fields, demat, strategy, date=None):
+        """Map a holdings export onto transaction columns. Returns (transactions, errors)."""
+        date = date or datetime.date.today().isoformat()
+        return PortfolioUtils._to_transactions(
+            df,
+            PortfolioUtils.first_present(df, fields["symbol"]),
+            PortfolioUtils.first_present(df, fields["qty"]),
+            PortfolioUtils.first_present(df, fields["price"]),
+            "BUY", date, demat, strategy,
+        )
+
+    @staticmethod
+    @timed("utils.normalize_trades")
+    def normalize_trades(df, demat, strategy):
+        """Map a trade log onto transaction columns. Returns (transactions, errors)."""
+        side = PortfolioUtils.first_present(df, TRADE_FIELDS["side"]).fillna("BUY").astype(str).str.upper()
+        date = PortfolioUtils.first_present(df, TRADE_FIELDS["date"])
+        dated = date.notna()
+        date = date.where(dated, str(datetime.date.today())).astype(str)
+        return PortfolioUtils._to_transactions(
+            df,
+            PortfolioUtils.first_present(df, TRADE_FIELDS["symbol"]),
+            PortfolioUtils.first_present(df, TRADE_FIELDS["qty"]),
+            PortfolioUtils.first_present(df, TRADE_FIELDS["price"]),
+            side, date, demat, strategy, dated,
+        )
@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from utils.profiling import span, timed
+
+
+class PriceProvider:
+    """Source of current prices. Subclasses implement get_prices for a batch of symbols."""
+
+    def get_prices(self, symbols):
+        """Return {symbol: price} for the symbols the source knows; unknown symbols are omitted."""
+        raise NotImplementedError
+
+
+class MockPriceProvider(PriceProvider):
+    """Stable pseudo-random prices in [low, high), derived from the symbol name."""
+
+    def __init__(self, low=100, high=2000):
+        self.low = low
+        self.high = high
+
+    def get_prices(self, symbols):
+        span = self.high - self.low
+        return {s: round(self.low + span * (zlib.crc32(str(s).encode()) / 2**32), 2) for s in symbols}
+
+
+class FilePriceProvider(PriceProvider):
+    """Prices from a fixture file: CSV with symbol,price columns or a JSON {symbol: price} object.
+
+    The file is re-read when its modification time changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self._prices = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        mtime = os.path.getmtime(self.path)
+        if mtime == self._mtime:
+            return self._prices
+        if self.path.endswith(".json"):
+            with open(self.path) as f:
+                prices = {str(k): float(v) for k, v in json.load(f).items()}
+        else:
+            import pandas as pd
+            df = pd.read_csv(self.path)
+            df.columns = [c.strip().lower() for c in df.columns]
+            prices = dict(zip(df["symbol"].astype(str), df["price"].astype(float)))
+        self._prices, self._mtime = prices, mtime
+        return prices
+
+    def get_prices(self, symbols):
+        with self._lock:
+            prices = self._load()
+        return {s: prices[s] for s in symbols if s in prices}
+
+
+class CachedPriceProvider(PriceProvider):
+    """TTL/LRU cache in front of another provider.
+
+    Misses are first served from the last-known prices in SQLite (when still
+    within the TTL) so a cold process does not refetch everything. Concurrent
+    callers asking for overlapping symbols share one in-flight fetch per
+    symbol. If the source fails, stale cached or stored prices are returned.
+    """
+
+    def __init__(self, source, db=None, ttl=300, maxsize=10_000):
+        self.source = source
+        self.db = db
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._cache = OrderedDict()  # symbol -> (price, fetched_at)
+        self._inflight = {}  # symbol -> Future of the batch fetching it
+        self._lock = threading.Lock()
+
+    @timed("prices.get_prices")
+    def get_prices(self, symbols):
+        now = time.time()
+        symbols = list(dict.fromkeys(symbols))
+        result = {}
+        with self._lock:
+            missing = self._from_cache(symbols, now, result)
+        if missing and self.db is not None:
+            stored = self.db.fetch_last_prices(missing)
+            fresh = {s: v for s, v in stored.items() if now - v[1] < self.ttl}
+            with self._lock:
+                for s, (price, fetched_at) in fresh.items():
+                    self._put(s, price, fetched_at)
+                    result[s] = price
+            missing = [s for s in missing if s not in fresh]
+        if missing:
+            result.update(self._fetch(missing))
+        return result
+
+    def _from_cache(self, symbols, now, result):
+        missing = []
+        for s in symbols:
+            entry = self._cache.get(s)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._cache.move_to_end(s)
+                result[s] = entry[0]
+            else:
+                missing.append(s)
+        return missing
+
+    def _put(self, symbol, price, fetched_at):
+        self._cache[symbol] = (price, fetched_at)
+        self._cache.move_to_end(symbol)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def _fetch(self, symbols):
+        waiting = {}
+        to_fetch = []
+        with self._lock:
+            for s in symbols:
+                if s in self._inflight:
+                    waiting[s] = self._inflight[s]
+                else:
+                    to_fetch.append(s)
+            if to_fetch:
+                future = Future()
+                for s in to_fetch:
+                    self._inflight[s] = future
+        result = {}
+        if to_fetch:
+            try:
+                with span("prices.source", rows=len(to_fetch)):
+                    fetched = self.source.get_prices(to_fetch)
+                fetched_at = time.time()
+                with self._lock:
+                    for s, price in fetched.items():
+                        self._put(s, price, fetched_at)
+                if self.db is not None and fetched:
+                    self.db.save_prices(fetched, fetched_at)
+                future.set_result(fetched)
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    for s in to_fetch:
+                        self._inflight.pop(s, None)
+            result.update(self._collect(future, to_fetch))
+        for s, fut in waiting.items():
+            result.update(self._collect(fut, [s]))
+        return result
+
+    def _collect(self, future, symbols):
+        try:
+            fetched = future.result()
+            return {s: fetched[s] for s in symbols if s in fetched}
+        except Exception:
+            return self._stale(symbols)
+
+    def _stale(self, symbols):
+        # Source is down: fall back to whatever we last saw, however old
+        with self._lock:
+            stale = {s: self._cache[s][0] for s in symbols if s in self._cache}
+        rest = [s for s in symbols if s not in stale]
+        if rest and self.db is not None:
+            stale.update({s: v[0] for s, v in self.db.fetch_last_prices(rest).items()})
+        return stale
+
+
+def default_provider(db=None, ttl=300):
+    """The app's configured source (STOX_PRICE_FILE, else mock prices) behind a CachedPriceProvider."""
+    price_file = os.environ.get("STOX_PRICE_FILE")
+    source = FilePriceProvider(price_file) if price_file else MockPriceProvider()
+    return CachedPriceProvider(source, db=db, ttl=ttl)
@@ -0,0 +1,164 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+# STOX_PROFILE=0 turns instrumentation off at import time: timed() returns
+# the function unchanged and span() is a shared no-op context.
+ENABLED = os.environ.get("STOX_PROFILE", "1") != "0"
+MAX_SPANS = int(os.environ.get("STOX_PROFILE_SPANS", "20000"))
+SPAN_FIELDS = ["run", "name", "depth", "thread", "started_at", "duration_ms", "rows", "rss_delta_kb"]
+
+_NULL_SPAN = nullcontext({})
+
+
+def _open_statm():
+    try:
+        return os.open("/proc/self/statm", os.O_RDONLY), os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, AttributeError, ValueError):
+        return None, 0
+
+
+# Resident pages are the second field of /proc/self/statm (Linux). The
+# descriptor points at the opening process, so a forked child reopens it.
+_STATM, _PAGE_KB = _open_statm()
+_STATM_PID = os.getpid()
+_PROCESS = None
+if _STATM is None:
+    try:
+        import psutil
+        _PROCESS = psutil.Process()
+    except ImportError:  # no /proc and no psutil: deltas read 0
+        pass
+
+
+def _rss_kb():
+    """Current resident set size in KiB (0 where it cannot be read)."""
+    global _STATM, _STATM_PID
+    if _STATM is not None:
+        if _STATM_PID != os.getpid():
+            _STATM, _STATM_PID = _open_statm()[0], os.getpid()
+        # pread keeps the shared descriptor safe to use from several threads
+        return int(os.pread(_STATM, 64, 0).split()[1]) * _PAGE_KB
+    if _PROCESS is not None:
+        return _PROCESS.memory_info().rss // 1024
+    return 0
+
+
+def _count_rows(result):
+    shape = getattr(result, "shape", None)
+    if shape:
+        return int(shape[0])
+    if isinstance(result, (dict, list, tuple)) and not hasattr(result, "_fields"):
+        return len(result)
+    return None
+
+
+class Profiler:
+    """Ring buffer of timing spans, grouped into runs (one per Streamlit rerun)."""
+
+    def __init__(self, maxlen=MAX_SPANS):
+        self.spans = deque(maxlen=maxlen)
+        self.run = 0
+        self.run_labels = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def start_run(self, label=None):
+        with self._lock:
+            self.run += 1
+            self.run_labels[self.run] = label
+            # Forget labels whose spans have been evicted from the buffer
+            if self.spans:
+                oldest = self.spans[0][0]
+                for run in [r for r in self.run_labels if r < oldest]:
+                    del self.run_labels[run]
+        return self.run
+
+    def label_run(self, label):
+        self.run_labels[self.run] = label
+
+    @contextmanager
+    def span(self, name, rows=None):
+        """Time a block. Yields a dict; set info["rows"] to record a row count."""
+        info = {"rows": rows}
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        rss = _rss_kb()
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self._local.depth = depth
+            self.spans.append((self.run, name, depth, threading.current_thread().name, started_at,
+                               round(elapsed, 3), info["rows"], _rss_kb() - rss))
+
+    def timed(self, name):
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name) as info:
+                    result = func(*args, **kwargs)
+                    info["rows"] = _count_rows(result)
+                    return result
+            return wrapper
+        return decorate
+
+    def records(self):
+        return [dict(zip(SPAN_FIELDS, span)) for span in list(self.spans)]
+
+    def to_json(self):
+        return json.dumps({"runs": {str(k): v for k, v in self.run_labels.items()},
+                           "spans": self.records()}, indent=1)
+
+    def clear(self):
+        self.spans.clear()
+
+
+PROFILER = Profiler()
+
+
+def span(name, rows=None):
+    if not ENABLED:
+        return _NULL_SPAN
+    return PROFILER.span(name, rows)
+
+
+def timed(name):
+    """Decorator recording each call as a span; the row count comes from the result's len/shape."""
+    if not ENABLED:
+        return lambda func: func
+    return PROFILER.timed(name)
+
+
+def timed_methods(prefix):
+    """Class decorator applying timed() to every public method, named prefix.method.
+
+    Generator functions are left alone since only creating the generator
+    would be timed.
+    """
+    def decorate(cls):
+        if not ENABLED:
+            return cls
+        for attr, func in list(vars(cls).items()):
+            if attr.startswith("_") or not inspect.isfunction(func) or inspect.isgeneratorfunction(func):
+                continue
+            setattr(cls, attr, timed(f"{prefix}.{attr}")(func))
+        return cls
+    return decorate
+
+
+def start_run(label=None):
+    if ENABLED:
+        PROFILER.start_run(label)
+
+
+def label_run(label):
+    if ENABLED:
+        PROFILER.label_run(label)
@@ -0,0 +1,356 @@
+import datetime
+import json
+import os
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from utils.portfolio_utils import PortfolioUtils
+from utils.profiling import timed
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+EPOCH = np.datetime64("1970-01-01", "D")
+
+# Logical column types: "date" is stored as int32 days since the epoch,
+# "category" as int32 codes into a dictionary kept in meta.json.
+POSITION_SCHEMA = {
+    "date": "date", "demat": "category", "strategy": "category", "symbol": "category",
+    "net_qty": "float64", "open_cost": "float64", "price": "float64", "value": "float64",
+}
+GROUP_SCHEMA = {
+    "date": "date", "demat": "category", "strategy": "category",
+    "value": "float64", "open_cost": "float64", "realized_pnl": "float64", "invested": "float64",
+}
+CASH_SCHEMA = {"date": "date", "demat": "category", "balance": "float64", "flow": "float64"}
+PHYSICAL_DTYPES = {"date": "<i4", "category": "<i4", "float64": "<f8"}
+
+SnapshotResult = namedtuple("SnapshotResult", ["date", "positions", "groups", "cash"])
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock on path shared by every process, e.g. the snapshot cron job and the app."""
+    with open(path, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # retries for ~10 s, then raises OSError
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _day(value):
+    return int((np.datetime64(pd.Timestamp(value).date(), "D") - EPOCH).astype("int64"))
+
+
+class ColumnStore:
+    """Append-only table kept as one raw little-endian file per column.
+
+    meta.json holds the committed row count and the category dictionaries.
+    It is replaced atomically after the column files are appended, so a
+    crash mid-append leaves the previous row count and the uncommitted tail
+    is truncated by the next append. Reads memory-map the column files, and
+    rows are appended in date order so date ranges are two binary searches.
+    One writer at a time (SnapshotStore.take holds a file lock), and it
+    refreshes before appending.
+    """
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        self._meta_mtime = None
+        os.makedirs(path, exist_ok=True)
+        self.refresh()
+
+    def __len__(self):
+        return self.rows
+
+    def _file(self, col):
+        return os.path.join(self.path, f"{col}.bin")
+
+    def _meta_path(self):
+        return os.path.join(self.path, "meta.json")
+
+    def refresh(self, limit=None):
+        """Pick up rows appended by another process (e.g. the snapshot CLI).
+
+        limit caps the rows seen at a count committed elsewhere (the
+        SnapshotStore manifest); rows past it are truncated by the next append.
+        """
+        try:
+            mtime = os.stat(self._meta_path()).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._meta_mtime or mtime is None:
+            meta = {"rows": 0, "dictionaries": {}}
+            if mtime is not None:
+                with open(self._meta_path()) as f:
+                    meta = json.load(f)
+            self._meta_mtime = mtime
+            self._meta_rows = meta["rows"]
+            self.dictionaries = {c: list(meta["dictionaries"].get(c, [])) for c, kind in self.schema.items() if kind == "category"}
+            self._codes = {c: {v: i for i, v in enumerate(values)} for c, values in self.dictionaries.items()}
+        self.rows = self._meta_rows if limit is None else min(self._meta_rows, limit)
+
+    def _write_meta(self):
+        tmp = self._meta_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"rows": self.rows, "schema": self.schema, "dictionaries": self.dictionaries}, f)
+        os.replace(tmp, self._meta_path())
+        self._meta_mtime = os.stat(self._meta_path()).st_mtime_ns
+
+    def _encode(self, col, values):
+        # Look up each distinct label once, then broadcast the codes back
+        uniques, inverse = np.unique(values.astype(str).to_numpy(dtype=object), return_inverse=True)
+        codes, labels = self._codes[col], self.dictionaries[col]
+        mapping = np.empty(len(uniques), dtype="int32")
+        for i, label in enumerate(uniques.tolist()):
+            code = codes.get(label)
+            if code is None:
+                code = codes[label] = len(labels)
+                labels.append(label)
+            mapping[i] = code
+        return mapping[inverse.ravel()]
+
+    def append(self, frame):
+        if frame.empty:
+            return 0
+        data = {}
+        for col, kind in self.schema.items():
+            if kind == "category":
+                values = self._encode(col, frame[col])
+            elif kind == "date":
+                days = pd.to_datetime(frame[col]).to_numpy().astype("datetime64[D]")
+                values = (days - EPOCH).astype("int64")
+            else:
+                values = frame[col].to_numpy(dtype=kind)
+            data[col] = np.ascontiguousarray(values, dtype=PHYSICAL_DTYPES[kind])
+        for col, values in data.items():
+            with open(self._file(col), "ab") as f:
+                # Drop any tail left by an append that never committed
+                f.truncate(self.rows * values.itemsize)
+                f.write(values.tobytes())
+        self.rows += len(frame)
+        self._write_meta()
+        self._meta_rows = self.rows
+        return len(frame)
+
+    def column(self, col, lo=0, hi=None):
+        """Raw stored values (codes for categories, day numbers for dates), memory-mapped."""
+        hi = self.rows if hi is None else hi
+        dtype = np.dtype(PHYSICAL_DTYPES[self.schema[col]])
+        if hi <= lo:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._file(col), dtype=dtype, mode="r", shape=(self.rows,))[lo:hi]
+
+    def date_range(self, start=None, end=None):
+        """Row bounds [lo, hi) covering start..end inclusive."""
+        dates = self.column("date")
+        lo = 0 if start is None else int(np.searchsorted(dates, _day(start), "left"))
+        hi = self.rows if end is None else int(np.searchsorted(dates, _day(end), "right"))
+        return lo, hi
+
+    def codes_for(self, col, labels):
+        return np.array([self._codes[col][v] for v in labels if v in self._codes[col]], dtype="int32")
+
+    def frame(self, columns=None, start=None, end=None):
+        lo, hi = self.date_range(start, end)
+        out = {}
+        for col in columns or list(self.schema):
+            values = self.column(col, lo, hi)
+            kind = self.schema[col]
+            if kind == "category":
+                out[col] = pd.Categorical.from_codes(values, categories=self.dictionaries[col])
+            elif kind == "date":
+                out[col] = values.astype("int64").astype("datetime64[D]")
+            else:
+                out[col] = np.asarray(values)
+        return pd.DataFrame(out)
+
+
+class SnapshotStore:
+    """Daily valuations: per position, per (demat, strategy) and per-demat cash.
+
+    Only the group and cash tables are read for NAV history; the position
+    table is kept for drill-down. A snapshot values the current positions at
+    current prices, so history builds up one day at a time.
+
+    manifest.json records the committed row count of all three tables and is
+    replaced after they are appended, so a day is stored in full or not at
+    all: rows of a take that died part way are ignored and overwritten.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.positions = ColumnStore(os.path.join(root, "positions"), POSITION_SCHEMA)
+        self.groups = ColumnStore(os.path.join(root, "groups"), GROUP_SCHEMA)
+        self.cash = ColumnStore(os.path.join(root, "cash"), CASH_SCHEMA)
+        self._lock = threading.Lock()
+        self.refresh()
+
+    @classmethod
+    def for_db(cls, db_file):
+        root = os.environ.get("STOX_SNAPSHOT_DIR") or os.path.splitext(os.path.abspath(db_file))[0] + "_snapshots"
+        return cls(root)
+
+    def _tables(self):
+        return {"positions": self.positions, "groups": self.groups, "cash": self.cash}
+
+    def _manifest_path(self):
+        return os.path.join(self.root, "manifest.json")
+
+    def refresh(self):
+        try:
+            with open(self._manifest_path()) as f:
+                committed = json.load(f)["rows"]
+        except FileNotFoundError:
+            committed = {}  # written by the first take; older stores go by each table's meta.json
+        for name, store in self._tables().items():
+            store.refresh(committed.get(name))
+
+    def _commit(self):
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"rows": {name: len(store) for name, store in self._tables().items()}}, f)
+        os.replace(tmp, self._manifest_path())
+
+    def version(self):
+        return len(self.positions), len(self.groups), len(self.cash)
+
+    def dates(self):
+        days = np.union1d(self.groups.column("date"), self.cash.column("date"))
+        return days.astype("int64").astype("datetime64[D]")
+
+    def last_date(self):
+        # Rows are in date order, so the last row of each table is its latest day
+        last = [int(store.column("date", len(store) - 1)[0]) for store in (self.groups, self.cash) if len(store)]
+        return pd.Timestamp(np.datetime64(max(last), "D")).date() if last else None
+
+    @timed("snapshots.take")
+    def take(self, db, price_provider, date=None):
+        """Value current positions and cash and append them as the snapshot for date (default today).
+
+        Returns None if that date is already stored; dates must increase.
+        """
+        date = pd.Timestamp(date or datetime.date.today()).date()
+        # The thread lock covers this process, the file lock other processes
+        with self._lock, _file_lock(os.path.join(self.root, ".lock")):
+            self.refresh()
+            last = self.last_date()
+            if last is not None and date == last:
+                return None
+            if last is not None and date < last:
+                raise ValueError(f"Snapshots are append-only; the latest is {last}")
+
+            db.sync_lots()
+            positions = db.fetch_positions(open_only=False)
+            open_symbols = positions.loc[positions["net_qty"] > 0, "symbol"].unique().tolist()
+            holdings = PortfolioUtils.holdings_from_positions(positions, price_provider.get_prices(open_symbols))
+            keys = ["demat", "strategy"]
+            if holdings.empty:
+                holdings = pd.DataFrame(columns=keys + ["symbol", "net_qty", "cmp", "investment", "current_value"])
+            position_rows = pd.DataFrame({
+                "date": date,
+                "demat": holdings["demat"], "strategy": holdings["strategy"], "symbol": holdings["symbol"],
+                "net_qty": holdings["net_qty"], "open_cost": holdings["investment"],
+                "price": holdings["cmp"], "value": holdings["current_value"],
+            })
+
+            # Net cash put into a group by its trades: cost of what is still
+            # open minus the gains already taken out
+            realized = positions.groupby(keys)["realized_pnl"].sum()
+            valued = holdings.groupby(keys)[["current_value", "investment"]].sum()
+            groups = valued.reindex(valued.index.union(realized.index), fill_value=0.0)
+            groups["realized_pnl"] = realized.reindex(groups.index, fill_value=0.0).astype("float64")
+            groups = groups.reset_index().rename(columns={"current_value": "value", "investment": "open_cost"})
+            groups["invested"] = groups["open_cost"] - groups["realized_pnl"]
+            groups.insert(0, "date", date)
+
+            ledger = db.query_cash(columns=["date", "demat", "amount"], end_date=date.isoformat())
+            ledger["amount"] = ledger["amount"].astype("float64")
+            since = ledger["date"] > last.isoformat() if last is not None else pd.Series(True, index=ledger.index)
+            cash = pd.DataFrame({
+                "balance": ledger.groupby("demat")["amount"].sum(),
+                "flow": ledger[since].groupby("demat")["amount"].sum(),
+            }).fillna(0.0).rename_axis("demat").reset_index()
+            cash.insert(0, "date", date)
+
+            result = SnapshotResult(date, self.positions.append(position_rows),
+                                    self.groups.append(groups), self.cash.append(cash))
+            self._commit()
+        return result
+
+    @timed("snapshots.nav_series")
+    def nav_series(self, demats=None, strategies=None, start=None, end=None):
+        """Daily NAV and external flows for the selected demats/strategies.
+
+        A demat with cash ledger entries is valued as positions + cash, where
+        cash is the ledger balance less what its trades have spent, and its
+        flows are the ledger entries. Demats without a ledger, and any
+        strategy-filtered view (cash is not split by strategy), are treated
+        as funded by their trades: NAV is the positions' value and the flow
+        is the day's change in net traded cash.
+        """
+        self.refresh()
+        lo, hi = self.groups.date_range(start, end)
+        g_day = self.groups.column("date", lo, hi)
+        g_demat = self.groups.column("demat", lo, hi)
+        mask = np.ones(len(g_day), dtype=bool)
+        if demats:
+            mask &= np.isin(g_demat, self.groups.codes_for("demat", demats))
+        if strategies:
+            mask &= np.isin(self.groups.column("strategy", lo, hi), self.groups.codes_for("strategy", strategies))
+        g_day, g_demat = g_day[mask], g_demat[mask]
+        value = np.asarray(self.groups.column("value", lo, hi))[mask]
+        invested = np.asarray(self.groups.column("invested", lo, hi))[mask]
+
+        c_lo, c_hi = self.cash.date_range(start, end)
+        c_day = self.cash.column("date", c_lo, c_hi)
+        c_labels = np.asarray(self.cash.dictionaries["demat"], dtype=object)[self.cash.column("demat", c_lo, c_hi)] \
+            if c_hi > c_lo else np.empty(0, dtype=object)
+        c_mask = np.isin(c_labels, list(demats)) if demats else np.ones(len(c_day), dtype=bool)
+        if strategies:
+            c_mask[:] = False
+        c_day, c_labels = c_day[c_mask], c_labels[c_mask]
+
+        days = np.union1d(g_day, c_day)
+        if len(days) == 0:
+            return pd.DataFrame(columns=["date", "nav", "flow"])
+        # Work in a days x demats grid keyed on demat labels (dictionaries differ per table)
+        g_labels = np.asarray(self.groups.dictionaries["demat"], dtype=object)[g_demat] if len(g_demat) else np.empty(0, dtype=object)
+        demat_codes, all_demats = pd.factorize(np.concatenate([g_labels, c_labels]))
+        n_days, n_demats = len(days), len(all_demats)
+        g_cell = np.searchsorted(days, g_day) * n_demats + demat_codes[:len(g_labels)]
+        c_cell = np.searchsorted(days, c_day) * n_demats + demat_codes[len(g_labels):]
+
+        # bincount returns int64 for empty input, so cast to keep float math
+        def grid(cells, weights):
+            return np.bincount(cells, weights=weights, minlength=n_days * n_demats).astype("float64").reshape(n_days, n_demats)
+
+        inv = grid(g_cell, invested)
+        has_cash = np.zeros(n_demats, dtype=bool)
+        has_cash[np.unique(demat_codes[len(g_labels):])] = True
+        balance = grid(c_cell, np.asarray(self.cash.column("balance", c_lo, c_hi))[c_mask])
+        ledger_flow = grid(c_cell, np.asarray(self.cash.column("flow", c_lo, c_hi))[c_mask])
+
+        nav = np.bincount(np.searchsorted(days, g_day), weights=value, minlength=n_days).astype("float64")
+        nav += (balance - inv)[:, has_cash].sum(axis=1)
+        traded = np.diff(inv[:, ~has_cash], axis=0, prepend=inv[:1, ~has_cash]).sum(axis=1)
+        flow = ledger_flow[:, has_cash].sum(axis=1) + traded
+        flow[0] = 0.0
+        return pd.DataFrame({"date": days.astype("int64").astype("datetime64[D]"), "nav": nav, "flow": flow})